@@ -1,49 +1,77 @@
-class ProgramNode:
+import sys
+
+# Nodes use __slots__ instead of a per-instance __dict__, which keeps large
+# ASTs compact.  Slots are listed in constructor order, so
+# cls(*(getattr(node, f) for f in cls.__slots__)) rebuilds a node.
+class Node:
+    __slots__ = ()
+
+
+def walk(node):
+    """Yield node and every node below it (in no particular order)."""
+    stack = [node]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Node):
+            yield value
+            stack.extend(getattr(value, f) for f in value.__slots__)
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+class ProgramNode(Node):
+    __slots__ = ('declarations',)
     def __init__(self, declarations):
         self.declarations = declarations
     def __repr__(self):
         return f"Program({self.declarations})"
 
 
-class BlockNode:
+class BlockNode(Node):
+    __slots__ = ('statements',)
     def __init__(self, statements):
         self.statements = statements
     def __repr__(self):
         return f"Block({self.statements})"
 
 
-class DeclarationNode:
+class DeclarationNode(Node):
+    __slots__ = ('type_name', 'name', 'value')
     def __init__(self, type_name, name, value):
         self.type_name = type_name
-        self.name = name
+        self.name = sys.intern(name)
         self.value = value
     def __repr__(self):
         return f"Decl({self.type_name} {self.name} = {self.value})"
 
 
-class AssignNode:
+class AssignNode(Node):
+    __slots__ = ('name', 'value')
     def __init__(self, name, value):
-        self.name = name
+        self.name = sys.intern(name)
         self.value = value
     def __repr__(self):
         return f"Assign({self.name}={self.value})"
 
 
-class PrintNode:
+class PrintNode(Node):
+    __slots__ = ('expr',)
     def __init__(self, expr_list):
         self.expr = expr_list
     def __repr__(self):
         return f"Print({self.expr})"
 
 
-class InputNode:
+class InputNode(Node):
+    __slots__ = ('targets',)
     def __init__(self, targets):
         self.targets = targets
     def __repr__(self):
         return f"Input({self.targets})"
 
 
-class IfNode:
+class IfNode(Node):
+    __slots__ = ('cond', 'then', 'else_')
     def __init__(self, cond, then, else_):
         self.cond = cond
         self.then = then
@@ -52,7 +80,8 @@ class IfNode:
         return f"If({self.cond}, {self.then}, else={self.else_})"
 
 
-class WhileNode:
+class WhileNode(Node):
+    __slots__ = ('cond', 'body')
     def __init__(self, cond, body):
         self.cond = cond
         self.body = body
@@ -60,7 +89,8 @@ class WhileNode:
         return f"While({self.cond}, {self.body})"
 
 
-class ForNode:
+class ForNode(Node):
+    __slots__ = ('init', 'cond', 'incr', 'body')
     def __init__(self, init, cond, incr, body):
         self.init = init
         self.cond = cond
@@ -70,40 +100,45 @@ class ForNode:
         return f"For({self.init}, {self.cond}, {self.incr}, {self.body})"
 
 
-class ReturnNode:
+class ReturnNode(Node):
+    __slots__ = ('expr',)
     def __init__(self, expr):
         self.expr = expr
     def __repr__(self):
         return f"Return({self.expr})"
 
 
-class FunctionNode:
+class FunctionNode(Node):
+    __slots__ = ('ret_type', 'name', 'params', 'body')
     def __init__(self, ret_type, name, params, body):
         self.ret_type = ret_type
-        self.name = name
+        self.name = sys.intern(name)
         self.params = params
         self.body = body
     def __repr__(self):
         return f"Function({self.ret_type} {self.name}({self.params}) {self.body})"
 
 
-class ParamNode:
+class ParamNode(Node):
+    __slots__ = ('type_name', 'name')
     def __init__(self, type_name, name):
         self.type_name = type_name
-        self.name = name
+        self.name = sys.intern(name)
     def __repr__(self):
         return f"Param({self.type_name} {self.name})"
 
 
-class CallNode:
+class CallNode(Node):
+    __slots__ = ('name', 'args')
     def __init__(self, name, args):
-        self.name = name
+        self.name = sys.intern(name)
         self.args = args
     def __repr__(self):
         return f"Call({self.name}, {self.args})"
 
 
-class BinOpNode:
+class BinOpNode(Node):
+    __slots__ = ('op', 'left', 'right')
     def __init__(self, op, left, right):
         self.op = op
         self.left = left
@@ -112,7 +147,8 @@ class BinOpNode:
         return f"BinOp({self.left} {self.op} {self.right})"
 
 
-class UnaryOpNode:
+class UnaryOpNode(Node):
+    __slots__ = ('op', 'expr')
     def __init__(self, op, expr):
         self.op = op
         self.expr = expr
@@ -120,29 +156,191 @@ class UnaryOpNode:
         return f"Unary({self.op} {self.expr})"
 
 
-class NumNode:
+class NumNode(Node):
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
     def __repr__(self):
         return f"Num({self.value})"
 
 
-class BoolNode:
+# There are only two booleans, so BoolNode(x) always returns one of two
+# shared instances.  Passes must build new nodes rather than mutate these.
+class BoolNode(Node):
+    __slots__ = ('value',)
+    _shared = {}
+    def __new__(cls, value):
+        value = bool(value)
+        node = cls._shared.get(value)
+        if node is None:
+            node = super().__new__(cls)
+            node.value = value
+            cls._shared[value] = node
+        return node
     def __init__(self, value):
-        self.value = bool(value)
+        pass
+    def __reduce__(self):
+        return (BoolNode, (self.value,))
     def __repr__(self):
         return f"Bool({self.value})"
 
 
-class VarNode:
+class VarNode(Node):
+    __slots__ = ('name',)
     def __init__(self, name):
-        self.name = name
+        self.name = sys.intern(name)
     def __repr__(self):
         return f"Var({self.name})"
 
 
-class StringNode:
+class StringNode(Node):
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
     def __repr__(self):
         return f"String({self.value!r})"
+
+
+# ------------------------------
+# Nodes only built by optimizer.py
+# ------------------------------
+class ImportNode(Node):
+    __slots__ = ('module', 'alias')
+    def __init__(self, module, alias=None):
+        self.module = module
+        self.alias = alias
+    def __repr__(self):
+        return f"Import({self.module} as {self.alias})"
+
+
+# (expr for var in iterable if cond)
+class GeneratorNode(Node):
+    __slots__ = ('expr', 'var', 'iterable', 'cond')
+    def __init__(self, expr, var, iterable, cond=None):
+        self.expr = expr
+        self.var = sys.intern(var)
+        self.iterable = iterable
+        self.cond = cond
+    def __repr__(self):
+        return f"Generator({self.expr} for {self.var} in {self.iterable} if {self.cond})"
+
+
+# name=value, as a call argument
+class KeywordNode(Node):
+    __slots__ = ('name', 'value')
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+    def __repr__(self):
+        return f"Keyword({self.name}={self.value})"
+
+
+# `continue`, which the C++ subset has no syntax for
+class ContinueNode(Node):
+    __slots__ = ()
+    def __repr__(self):
+        return "Continue"
+
+
+# ------------------------------
+# Visitors
+# ------------------------------
+def children(node):
+    """The nodes directly below node, in field order."""
+    for f in node.__slots__:
+        value = getattr(node, f)
+        if isinstance(value, Node):
+            yield value
+        elif isinstance(value, list):
+            yield from (v for v in value if isinstance(v, Node))
+
+
+class DispatchTable(dict):
+    """Maps node classes to a visitor class's method for them: the first
+    of `<prefix>_<ClassName>` for the node's class and its bases, else
+    `fallback`.  Each node class is looked up once and the method cached,
+    so dispatch costs one dict lookup however many kinds of node there are."""
+
+    def __init__(self, visitor, prefix, fallback):
+        super().__init__()
+        self.visitor = visitor
+        self.prefix = prefix
+        self.fallback = fallback
+
+    def __missing__(self, node_class):
+        for cls in node_class.__mro__:
+            method = getattr(self.visitor, f"{self.prefix}_{cls.__name__}", None)
+            if method is not None:
+                break
+        else:
+            method = getattr(self.visitor, self.fallback)
+        self[node_class] = method
+        return method
+
+
+def _add_dispatch_tables(cls):
+    """Give a visitor class fresh tables for its DISPATCH families and
+    those of its bases, since it may override their methods."""
+    families = {}
+    for base in reversed(cls.__mro__):
+        families.update(base.__dict__.get("DISPATCH", {}))
+    for prefix, fallback in families.items():
+        setattr(cls, f"_{prefix}_methods", DispatchTable(cls, prefix, fallback))
+
+
+class NodeVisitor:
+    """Base class for passes that do something different for each kind of
+    node.  visit(node, *args) calls self.visit_ForNode(node, *args) for a
+    ForNode, and so on, or generic_visit(node, *args) if there is no such
+    method (None is a NoneType, so visit_NoneType handles it).
+
+    A subclass may declare more families of methods, each with its own
+    fallback:  DISPATCH = {"expr": "expr_unknown"} gives it a DispatchTable
+    `_expr_methods` of its expr_<ClassName> methods, for a method like
+
+        def expr(self, node):
+            return self._expr_methods[type(node)](self, node)
+    """
+    DISPATCH = {"visit": "generic_visit"}     # prefix -> fallback method
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _add_dispatch_tables(cls)
+
+    def visit(self, node, *args):
+        return self._visit_methods[type(node)](self, node, *args)
+
+    def generic_visit(self, node, *args):
+        """Visit the nodes below node."""
+        if isinstance(node, Node):
+            for child in children(node):
+                self.visit(child, *args)
+
+
+_add_dispatch_tables(NodeVisitor)
+
+
+class NodeTransformer(NodeVisitor):
+    """A NodeVisitor whose methods return the node to put in place of the
+    one they are given.  generic_visit() transforms the nodes below and
+    returns the node itself if none of them changed, or else a new node;
+    trees are never changed in place, since they may be shared."""
+
+    def generic_visit(self, node, *args):
+        if not isinstance(node, Node):
+            return node
+        fields = []
+        changed = False
+        for f in node.__slots__:
+            old = getattr(node, f)
+            if isinstance(old, Node):
+                new = self.visit(old, *args)
+            elif isinstance(old, list):
+                new = [self.visit(v, *args) if isinstance(v, Node) else v for v in old]
+                if all(a is b for a, b in zip(new, old)):
+                    new = old
+            else:
+                new = old
+            changed = changed or new is not old
+            fields.append(new)
+        return type(node)(*fields) if changed else node
@@ -0,0 +1,124 @@
+"""Compact binary serialization of ASTs and an on-disk cache of them.
+
+A serialized tree is a short header followed by a zlib-compressed marshal
+payload in which every node is a tuple (tag, field, ...), tag being the
+node class's index in NODE_CLASSES and fields following the class's
+__slots__.  Lists stay lists; names, numbers and strings are stored as-is.
+ASTs are very repetitive, so even the fastest zlib level shrinks them
+about 20x, and decompressing costs little next to rebuilding the nodes.
+
+The header holds a format version and a checksum of the node layout
+(class names and slots), so data written by an incompatible version of
+ast_nodes.py is rejected rather than misread.
+"""
+import hashlib
+import marshal
+import os
+import struct
+import zlib
+
+from ast_nodes import *
+
+MAGIC = b"CPAST"
+FORMAT_VERSION = 1
+
+# Append only: a node's tag is its position in this tuple.
+NODE_CLASSES = (
+    ProgramNode, BlockNode, DeclarationNode, AssignNode, PrintNode,
+    InputNode, IfNode, WhileNode, ForNode, ReturnNode, FunctionNode,
+    ParamNode, CallNode, BinOpNode, UnaryOpNode, NumNode, BoolNode,
+    VarNode, StringNode, ImportNode, GeneratorNode, KeywordNode,
+    ContinueNode,
+)
+
+_TAGS = {cls: tag for tag, cls in enumerate(NODE_CLASSES)}
+
+LAYOUT = zlib.crc32(repr([(c.__name__, c.__slots__) for c in NODE_CLASSES]).encode())
+
+_HEADER = struct.Struct("<5sBI")
+
+
+class FormatError(ValueError):
+    pass
+
+
+def _encode(value):
+    if isinstance(value, Node):
+        cls = type(value)
+        return (_TAGS[cls],) + tuple(_encode(getattr(value, f)) for f in cls.__slots__)
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    return value
+
+def _decode(value):
+    if type(value) is tuple:
+        return NODE_CLASSES[value[0]](*[_decode(v) for v in value[1:]])
+    if type(value) is list:
+        return [_decode(v) for v in value]
+    return value
+
+
+def dumps(tree):
+    """Serialize an AST to bytes."""
+    payload = zlib.compress(marshal.dumps(_encode(tree), 4), 1)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, LAYOUT) + payload
+
+def loads(data):
+    """Rebuild an AST from dumps() output."""
+    try:
+        magic, version, layout = _HEADER.unpack_from(data)
+    except struct.error:
+        raise FormatError("truncated AST data") from None
+    if magic != MAGIC:
+        raise FormatError("not a serialized AST")
+    if version != FORMAT_VERSION or layout != LAYOUT:
+        raise FormatError(f"AST data is format {version}/{layout:08x}, "
+                          f"expected {FORMAT_VERSION}/{LAYOUT:08x}")
+    try:
+        payload = zlib.decompress(memoryview(data)[_HEADER.size:])
+    except zlib.error as e:
+        raise FormatError(f"corrupt AST data: {e}") from None
+    return _decode(marshal.loads(payload))
+
+
+# ------------------------------
+# Cache
+# ------------------------------
+# Changing any of these can change the tree built for the same source.
+PARSER_MODULES = ("lexer.py", "fastlexer.py", "parser.py", "ast_nodes.py", "astcache.py")
+
+def parser_version():
+    here = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for name in PARSER_MODULES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+class ASTCache:
+    """ASTs on disk, one file per distinct source text and parser version."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.version = parser_version()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, cpp_code):
+        key = hashlib.sha256(cpp_code.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, f"{key}-{self.version}.ast")
+
+    def get(self, cpp_code):
+        """The cached AST for cpp_code, or None."""
+        try:
+            with open(self.path(cpp_code), "rb") as f:
+                return loads(f.read())
+        except (OSError, FormatError, ValueError, EOFError):
+            return None
+
+    def put(self, cpp_code, tree):
+        path = self.path(cpp_code)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(dumps(tree))
+        os.replace(tmp, path)
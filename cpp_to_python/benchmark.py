@@ -0,0 +1,811 @@
+"""Performance checks for the translator.
+
+    python benchmark.py scaling            # parse time vs. input size, 1k to 1M
+    python benchmark.py scaling --max 100000
+    python benchmark.py memory             # bytes per AST node
+    python benchmark.py startup            # cold import time, optimized mode
+    python benchmark.py tokens             # fast vs. PLY lexer
+    python benchmark.py astcache           # AST load vs. parse
+    python benchmark.py optimize           # -O: faster programs
+    python benchmark.py optimize --numpy   # the same for -O --numpy
+    python benchmark.py io                 # generated programs reading lots of input
+    python benchmark.py memoize            # --memoize on recursive programs
+    python benchmark.py run                # --run vs. a new interpreter per program
+    python benchmark.py parallel           # --function-jobs on one huge file
+    python benchmark.py incremental        # re-translating edited files
+    python benchmark.py watch              # --watch: save-to-output latency
+    python benchmark.py dispatch           # visitor dispatch vs. isinstance chains
+
+    python benchmark.py suite --json new.json        # lex/parse/codegen times
+    python benchmark.py compare old.json new.json    # flag regressions
+    python benchmark.py runtime --json rt.json       # generated programs vs. g++
+    python benchmark.py suite --emit corpus/         # write the programs out
+
+Whether the fast paths give the same results as the plain ones is checked
+by the tests (python -m pytest tests).  The synthetic programs are shared
+with them through tests/programs.py.
+"""
+import argparse
+import compileall
+import contextlib
+import dis
+import gc
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import ast_nodes
+import astcache
+import codegen
+import optimizer
+from codegen import CodeGenerator
+from fastlexer import FastLexer
+from incremental import IncrementalTranslator
+from lexer import lexer
+from main import translate, natural_key, run_code
+from parser import parser, new_lexer, TokenListLexer
+from tests.programs import (EXPRESSION_CHAIN, STATEMENT_CHAIN, WORKLOADS, args_program,
+                            chain_program, dispatch_visitor, functions_program, fuzz_program,
+                            hot_loop_program, isinstance_chain, parse, reader_program,
+                            recursive_program, reduction_program, run_program, run_script,
+                            statements_program, tail_call_program, writer_program)
+
+
+def timed(func, *args):
+    """Wall time of func(*args), with the garbage of earlier runs collected
+    up front so it is not charged to this one."""
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+# ------------------------------
+# Commands
+# ------------------------------
+def cmd_scaling(args):
+    """Parse programs of growing size and check the cost per item stays flat."""
+    sizes = []
+    n = args.min
+    while n <= args.max:
+        sizes.append(n)
+        n *= 10
+
+    ok = True
+    for label, make in (("statements", statements_program),
+                        ("<< chain", chain_program),
+                        ("arguments", args_program)):
+        base = None
+        for n in sizes:
+            per_item = timed(parse, make(n)) / n
+            # The cheapest size so far: the first parse also warms up.
+            base = min(base or per_item, per_item)
+            ratio = per_item / base
+            print(f"{label:>10} {n:>9}: {per_item * 1e6:8.2f} us/item  x{ratio:.2f}")
+            if ratio > args.tolerance:
+                ok = False
+
+    if not ok:
+        print(f"FAIL: per-item cost grew by more than x{args.tolerance}")
+        return 1
+    print("OK: parse time scales linearly")
+    return 0
+
+
+def retained(build):
+    """Call build() and return (result, bytes it still holds on to)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+def dict_node_classes():
+    """Plain __dict__-based twins of the AST classes, for comparison."""
+    twins = {}
+    for cls in vars(ast_nodes).values():
+        if isinstance(cls, type) and issubclass(cls, ast_nodes.Node) and cls.__slots__:
+            def __init__(self, *values, _fields=cls.__slots__):
+                for field, value in zip(_fields, values):
+                    setattr(self, field, value)
+            twins[cls] = type(cls.__name__, (), {"__init__": __init__})
+    return twins
+
+def copy_tree(node, twins):
+    """Copy an AST into dict-based nodes.  Shared nodes (BoolNode) and
+    identifier strings are copied as the old classes would have held them."""
+    if isinstance(node, list):
+        return [copy_tree(n, twins) for n in node]
+    if not isinstance(node, ast_nodes.Node):
+        return node
+    values = []
+    for field in type(node).__slots__:
+        value = copy_tree(getattr(node, field), twins)
+        if field == "name" and isinstance(value, str):
+            value = "".join(list(value))      # un-interned copy, as lexed
+        values.append(value)
+    return twins[type(node)](*values)
+
+def count_nodes(node):
+    return sum(1 for _ in ast_nodes.walk(node))
+
+def cmd_memory(args):
+    """Report the bytes retained per AST node, slotted vs. dict-based."""
+    src = statements_program(args.size)
+    tree, slotted = retained(lambda: parse(src))
+    n = count_nodes(tree)
+
+    twins = dict_node_classes()
+    _, plain = retained(lambda: copy_tree(tree, twins))
+
+    print(f"{n} nodes")
+    print(f"  __dict__ nodes: {plain / n:7.1f} bytes/node  ({plain / 1e6:.1f} MB)")
+    print(f"  __slots__ nodes: {slotted / n:6.1f} bytes/node  ({slotted / 1e6:.1f} MB)")
+    print(f"  saved: {1 - slotted / plain:.0%}")
+    return 0
+
+
+def snapshot(folder):
+    return {(e.name, e.stat().st_mtime_ns) for e in os.scandir(folder)}
+
+def cmd_startup(args):
+    """Time cold imports of the parser and check they write no files."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    if args.optimize:
+        env["CPP2PY_OPTIMIZE"] = "1"
+
+    def cold(code):
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=here, env=env, check=True)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times)
+
+    # Measure an installed tree: bytecode compiled, as it would be after
+    # the first run.
+    compileall.compile_dir(here, maxlevels=0, quiet=1)
+
+    before = snapshot(here)
+    bare = cold("pass")
+    full = cold("import parser")
+    touched = snapshot(here) ^ before
+
+    overhead = (full - bare) * 1000
+    print(f"interpreter: {bare * 1000:6.1f} ms")
+    print(f"import parser: {full * 1000:6.1f} ms  (+{overhead:.1f} ms, target {args.target_ms} ms)")
+    if touched:
+        print("FAIL: import wrote", sorted(name for name, _ in touched))
+        return 1
+    if overhead > args.target_ms:
+        print("FAIL: over target")
+        return 1
+    print("OK")
+    return 0
+
+
+def count_tokens(lex, data):
+    lex.input(data)
+    return sum(1 for _ in iter(lex.token, None))
+
+def cmd_tokens(args):
+    """Compare the speed of the fast lexer and the PLY lexer."""
+    big = statements_program(args.size)
+    for name in ("ply", "fast"):
+        lex = new_lexer(name)
+        count = count_tokens(lex, big)
+        seconds = timed(count_tokens, lex, big)
+        print(f"{name:>5}: {count / seconds / 1e6:6.2f} M tokens/s")
+    return 0
+
+
+def cmd_astcache(args):
+    """Time loading a serialized AST against parsing the source."""
+    src = statements_program(args.size)
+    tree = parse(src)
+    data = astcache.dumps(tree)
+    parse_s = timed(parse, src)
+    load_s = timed(astcache.loads, data)
+    print(f"source: {len(src) / 1e6:.1f} MB, serialized AST: {len(data) / 1e6:.1f} MB")
+    print(f"parse: {parse_s * 1000:8.1f} ms")
+    print(f"load:  {load_s * 1000:8.1f} ms  (x{parse_s / load_s:.0f} faster)")
+    return 0
+
+
+def cmd_optimize(args):
+    """Time programs translated with and without -O (or -O --numpy)."""
+    label = "-O --numpy" if args.numpy else "-O"
+    workloads = (("hot loop", hot_loop_program), ("reductions", reduction_program),
+                 ("tail calls", tail_call_program))
+    for name, make in workloads:
+        tree = parse(make(args.size))
+        plain = CodeGenerator().generate(tree)
+        folded = CodeGenerator().generate(optimizer.optimize(tree, args.numpy))
+        plain_s = min(timed(run_program, plain) for _ in range(args.repeat))
+        folded_s = min(timed(run_program, folded) for _ in range(args.repeat))
+        print(f"{name:>10} x{args.size}: plain {plain_s * 1000:8.1f} ms  "
+              f"{label} {folded_s * 1000:8.1f} ms  (x{plain_s / folded_s:.2f})")
+    return 0
+
+
+def cmd_memoize(args):
+    """Time recursive programs with and without --memoize."""
+    tree = parse(recursive_program(args.size))
+    plain = CodeGenerator().generate(tree)
+    memoized = CodeGenerator(memoize=True).generate(tree)
+    print("memoized:", ", ".join(sorted(codegen.memoizable(tree))))
+    plain_s = min(timed(run_program, plain) for _ in range(args.repeat))
+    memoized_s = min(timed(run_program, memoized) for _ in range(args.repeat))
+    print(f"recursion n={args.size}: plain {plain_s * 1000:8.1f} ms  "
+          f"--memoize {memoized_s * 1000:8.1f} ms  (x{plain_s / memoized_s:.1f})")
+    return 0
+
+
+def cmd_run(args):
+    """Time running programs in-process (--run) against writing them out
+    and running each in a new interpreter."""
+    rng = random.Random(args.seed)
+    programs = [parse(fuzz_program(rng)) for _ in range(args.programs)]
+
+    def text(tree):
+        run_code(CodeGenerator().generate(tree))
+
+    def translate_only(compile_one):
+        for tree in programs:
+            compile_one(tree)
+
+    def run_all(run_one):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for tree in programs:
+                try:
+                    run_one(tree)
+                except Exception:
+                    pass
+
+    n = len(programs)
+    sample = programs[:args.processes]
+    scripts_s = sum(run_script(CodeGenerator().generate(tree), b"", check=False)[1] for tree in sample)
+    print(f"{'file + new interpreter':<28}{scripts_s / len(sample) * 1000:8.2f} ms per program")
+    for label, func, arg in (
+            ("in-process", run_all, text),
+            ("  generate + compile()", translate_only,
+             lambda t: compile(CodeGenerator().generate(t), "<generated>", "exec")),
+            ("  generate only", translate_only, lambda t: CodeGenerator().generate(t))):
+        seconds = min(timed(func, arg) for _ in range(args.repeat))
+        print(f"{label:<28}{seconds / n * 1000:8.2f} ms per program")
+    return 0
+
+
+def cmd_parallel(args):
+    """Time writing the functions of a file with many of them in several
+    processes."""
+    tree = parse(functions_program(args.size))
+    options = {"memoize": True, "buffered_output": True}
+    serial_s = timed(CodeGenerator(**options).generate, tree)
+    print(f"{args.size} functions, {os.cpu_count()} CPUs")
+    print(f"{'1 process':>12}: {serial_s * 1000:8.1f} ms")
+    for workers in args.workers:
+        seconds = timed(lambda: codegen.generate_parallel(tree, workers, **options))
+        print(f"{workers:>2} processes: {seconds * 1000:8.1f} ms  (x{serial_s / seconds:.2f})")
+    return 0
+
+
+def cmd_incremental(args):
+    """Time re-translating a big file after one function was edited
+    against translating it from scratch."""
+    src = functions_program(args.size)
+    i = src.index("s = s + (i * i)", len(src) // 2)
+    edited = src[:i] + "s = s + (i * i * i)" + src[i + len("s = s + (i * i)"):]
+    translator = IncrementalTranslator()
+    translator.translate(src)
+    full_s = timed(translate, edited, FastLexer())
+    incremental_s = timed(translator.translate, edited)
+    print(f"one function edited in {args.size}: full {full_s * 1000:8.1f} ms  "
+          f"incremental {incremental_s * 1000:8.1f} ms  (x{full_s / incremental_s:.0f}; "
+          f"{translator.reused} chunks reused, {translator.parsed} parsed)")
+    return 0
+
+
+def cmd_watch(args):
+    """Time from saving a big source to `main.py --watch` writing its
+    output, with inotify and with polling."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    src = functions_program(args.size)
+    for mode in ([], ["--poll"]):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "src", "big.cpp")
+            output_path = os.path.join(tmp, "out", "big.py")
+            os.mkdir(os.path.dirname(path))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(src)
+            proc = subprocess.Popen(
+                [sys.executable, "main.py", "--watch", *mode, "--src", os.path.dirname(path),
+                 "--out", os.path.dirname(output_path)],
+                cwd=here, stdout=subprocess.PIPE, text=True)
+            try:
+                while not proc.stdout.readline().startswith("Watching"):
+                    pass
+                latencies = []
+                for k in range(args.edits):
+                    edited = src.replace("return s;", f"return s + {k + 1};", 1)
+                    start = time.perf_counter()
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(edited)
+                    while not (line := proc.stdout.readline()).startswith(("[OK]", "[FAIL]")):
+                        if not line:
+                            print("FAIL: --watch exited")
+                            return 1
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                proc.terminate()
+                proc.wait()
+        print(f"{' '.join(mode) or 'inotify':>8}: save to output {statistics.median(latencies) * 1000:6.1f} ms "
+              f"(median of {args.edits}, {args.size} functions)")
+    return 0
+
+
+def cmd_dispatch(args):
+    """Time finding the code for each kind of node with isinstance() chains
+    and with NodeVisitor dispatch tables, and code generation per node."""
+    for name in args.only or list(WORKLOADS):
+        make, size = WORKLOADS[name]
+        tree = parse(make(max(1, int(size * args.scale))))
+        nodes = list(ast_nodes.walk(tree))
+        costs = []
+        for kind, names in (("statements", STATEMENT_CHAIN), ("expressions", EXPRESSION_CHAIN)):
+            sample = [n for n in nodes if type(n).__name__ in names]
+            chain, visit = isinstance_chain(names), dispatch_visitor(names).kind
+            if sample:
+                sample *= -(-10000 // len(sample))      # enough to time
+                chain_s = best_of(args.repeat, lambda: [chain(n) for n in sample])
+                table_s = best_of(args.repeat, lambda: [visit(n) for n in sample])
+                costs.append(f"{kind} {chain_s / len(sample) * 1e9:5.0f} -> "
+                             f"{table_s / len(sample) * 1e9:4.0f} ns")
+        generate_s = best_of(args.repeat, CodeGenerator().generate, tree)
+        print(f"{name:>11} {len(nodes):>7} nodes  {'  '.join(costs)}  "
+              f"generate {generate_s / len(nodes) * 1e9:5.0f} ns/node")
+    return 0
+
+
+def cmd_io(args):
+    """Time generated programs reading many numbers and printing many
+    lines, with and without --fast-input and --buffered-output."""
+    rng = random.Random(0)
+    numbers = [rng.randint(-10**9, 10**9) for _ in range(args.size)]
+    one_per_line = f"{len(numbers)}\n".encode() + b"\n".join(str(x).encode() for x in numbers) + b"\n"
+    tree = parse(reader_program())
+
+    _, plain_s = run_script(CodeGenerator().generate(tree), one_per_line)
+    _, fast_s = run_script(CodeGenerator(fast_input=True).generate(tree), one_per_line)
+    print(f"read {args.size} ints: input() {plain_s * 1000:8.1f} ms  "
+          f"--fast-input {fast_s * 1000:8.1f} ms  (x{plain_s / fast_s:.1f})")
+
+    tree = parse(writer_program(args.size))
+    _, plain_s = run_script(CodeGenerator().generate(tree), b"42\n")
+    for options in ({"buffered_output": True}, {"buffered_output": True, "fast_input": True}):
+        _, seconds = run_script(CodeGenerator(**options).generate(tree), b"42\n")
+        print(f"print {args.size} lines: print() {plain_s * 1000:8.1f} ms  "
+              f"{'+'.join(options)} {seconds * 1000:8.1f} ms  (x{plain_s / seconds:.1f})")
+    return 0
+
+
+def best_of(repeat, func, *args):
+    return min(timed(func, *args) for _ in range(repeat))
+
+def scan(src, lex=lexer):
+    lex.lineno = 1
+    lex.input(src)
+    return list(iter(lex.token, None))
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report_meta(args, **extra):
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        **extra,
+    }
+
+def cmd_suite(args):
+    """Time lexing, parsing and code generation on synthetic workloads."""
+    names = args.only or list(WORKLOADS)
+    lex = new_lexer(args.lexer)
+    results = {}
+    for name in names:
+        make, size = WORKLOADS[name]
+        size = max(1, int(size * args.scale))
+        src = make(size)
+        if args.emit:
+            os.makedirs(args.emit, exist_ok=True)
+            with open(os.path.join(args.emit, f"{name}.cpp"), "w", encoding="utf-8") as f:
+                f.write(src)
+
+        tokens = scan(src, lex)
+        tree = parser.parse(src, lexer=TokenListLexer(tokens))
+        code = CodeGenerator().generate(tree)
+        results[name] = {
+            "size": size,
+            "bytes": len(src),
+            "tokens": len(tokens),
+            "nodes": count_nodes(tree),
+            "output_bytes": len(code),
+            "lex_s": best_of(args.repeat, scan, src, lex),
+            "parse_s": best_of(args.repeat, lambda: parser.parse(src, lexer=TokenListLexer(tokens))),
+            "generate_s": best_of(args.repeat, lambda: CodeGenerator().generate(tree)),
+        }
+        r = results[name]
+        print(f"{name:>11} {r['tokens']:>8} tokens  lex {r['lex_s'] * 1000:8.1f} ms  "
+              f"parse {r['parse_s'] * 1000:8.1f} ms  generate {r['generate_s'] * 1000:8.1f} ms")
+
+    report = {"meta": report_meta(args, lexer=args.lexer), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+# ------------------------------
+# Generated programs at run time
+# ------------------------------
+# Programs whose outputs fit in a C++ int, so the native build is a
+# baseline for correctness as well as speed: (source, input) by name.
+RUNTIME_WORKLOADS = {
+    "hot_loop": (hot_loop_program, 300000),
+    "reduction": (reduction_program, 1000),
+    "tail_calls": (tail_call_program, 100000),
+    "recursion": (recursive_program, 22),
+    "functions": (functions_program, 200),
+}
+
+# Typed in by hand for the tests that read input
+TEST_STDIN = "5\n7\n3\n"
+
+RUNTIME_OPTIONS = {
+    "plain": {},
+    "O": {"optimize": True},
+    "O-numpy": {"optimize": True, "numpy": True},
+    "memoize": {"memoize": True},
+    "io": {"fast_input": True, "buffered_output": True},
+}
+
+CPP_PRELUDE = "#include <iostream>\nusing namespace std;\n"
+
+def runtime_corpus(scale):
+    """(name, C++ source, stdin) for tests/*.cpp and RUNTIME_WORKLOADS."""
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests")
+    programs = []
+    for name in sorted(os.listdir(folder), key=natural_key):
+        if name.endswith(".cpp"):
+            with open(os.path.join(folder, name), encoding="utf-8") as f:
+                programs.append((name, f.read(), TEST_STDIN))
+    for name, (make, size) in RUNTIME_WORKLOADS.items():
+        programs.append((name, make(max(1, int(size * scale))), ""))
+    return programs
+
+def native_source(src):
+    """src as g++ takes it: with the usual prelude and the functions
+    declared up front, since the translator does not need either."""
+    if "#include" in src:
+        return src
+    prototypes = "".join(f"{m[1]};\n" for m in
+                         re.finditer(r"^((?!int main)\w+ \w+\([^)]*\)) \{", src, re.M))
+    return CPP_PRELUDE + prototypes + src
+
+def run_timed(command, stdin, repeat):
+    """(best wall time, stdout, exit status) of a command fed stdin."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(command, input=stdin.encode(), capture_output=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, proc.stdout.decode("utf-8", "replace"), proc.returncode
+
+def same_tokens(output, expected):
+    """True if output prints the same words as expected, with numbers
+    compared by value: cout writes 2.5e+06 and 1 where print() writes
+    2500000.0 and 1.0, and only 6 significant digits."""
+    words, wanted = output.split(), expected.split()
+    if len(words) != len(wanted):
+        return False
+    for word, want in zip(words, wanted):
+        if word == want:
+            continue
+        try:
+            if not math.isclose(float(word), float(want), rel_tol=1e-5):
+                return False
+        except ValueError:
+            return False
+    return True
+
+def bytecode_size(code):
+    """Instructions in a module, counting nested functions."""
+    total = 0
+    stack = [compile(code, "<generated>", "exec")]
+    while stack:
+        co = stack.pop()
+        total += sum(1 for _ in dis.get_instructions(co))
+        stack.extend(c for c in co.co_consts if isinstance(c, type(co)))
+    return total
+
+def count_ops(code, stdin):
+    """Bytecode instructions executed by generated code, run in this
+    process under an opcode tracer (slow)."""
+    count = 0
+    def trace(frame, event, arg):
+        nonlocal count
+        if event == "call":
+            frame.f_trace_lines = False
+            frame.f_trace_opcodes = True
+        elif event == "opcode":
+            count += 1
+        return trace
+
+    saved = sys.stdin
+    sys.stdin = io.TextIOWrapper(io.BytesIO(stdin.encode()))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sys.settrace(trace)
+            try:
+                run_code(code)
+            except Exception:
+                pass
+            finally:
+                sys.settrace(None)
+    finally:
+        sys.stdin = saved
+    return count
+
+def cmd_runtime(args):
+    """Run the generated Python for a corpus of programs under each set of
+    options, and the programs built with a C++ compiler for comparison."""
+    cxx = None if args.no_cxx else args.cxx or shutil.which("g++") or shutil.which("c++")
+    cxx_version = None
+    if cxx:
+        cxx_version = subprocess.run([cxx, "--version"], capture_output=True,
+                                     text=True).stdout.partition("\n")[0]
+    startup = run_timed([sys.executable, "-c", "pass"], "", args.repeat)[0]
+    print(f"C++ baseline: {cxx_version or 'none'}")
+    print(f"Python startup: {startup * 1000:.1f} ms (included in every run)")
+    names = args.options or list(RUNTIME_OPTIONS)
+    results = {}
+    mismatches = inexact = failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, src, stdin in runtime_corpus(args.scale):
+            tree = parse(src)
+            native = None
+            if cxx:
+                exe = os.path.join(tmp, "native")
+                with open(exe + ".cpp", "w", encoding="utf-8") as f:
+                    f.write(native_source(src))
+                built = subprocess.run([cxx, "-O2", "-o", exe, exe + ".cpp"], capture_output=True)
+                if built.returncode == 0:
+                    native = run_timed([exe], stdin, args.repeat)[:2]
+                else:
+                    print(f"{name}: does not compile as C++")
+
+            for option in names:
+                options = dict(RUNTIME_OPTIONS[option])
+                optimize, numpy = options.pop("optimize", False), options.pop("numpy", False)
+                program = optimizer.optimize(tree, numpy) if optimize else tree
+                code = CodeGenerator(**options).generate(program)
+                path = os.path.join(tmp, "generated.py")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(code)
+                run_s, output, status = run_timed([sys.executable, path], stdin, args.repeat)
+                r = {"size": len(src), "run_s": run_s, "bytecode": bytecode_size(code),
+                     "output": output, "exit": status}
+                if args.ops:
+                    r["ops"] = count_ops(code, stdin)
+                if native:
+                    r["cpp_s"] = native[0]
+                    r["slowdown"] = run_s / native[0]
+                    r["matches_cpp"] = same_tokens(output, native[1])
+                    r["exact_cpp"] = output == native[1]
+                    if not r["exact_cpp"]:
+                        r["cpp_output"] = native[1]
+                    mismatches += not r["matches_cpp"]
+                    inexact += r["matches_cpp"] and not r["exact_cpp"]
+                results[f"{name} {option}"] = r
+
+                cells = [f"{name:>12} {option:<8} {run_s * 1000:8.1f} ms",
+                         f"{r['bytecode']:>6} instrs"]
+                if args.ops:
+                    cells.append(f"{r['ops']:>11} ops")
+                if native:
+                    same = ("same output" if r["exact_cpp"] else
+                            "same tokens" if r["matches_cpp"] else "output differs")
+                    cells.append(f"C++ {native[0] * 1000:6.1f} ms  x{r['slowdown']:5.1f}  {same}")
+                if status:
+                    cells.append(f"FAILED (exit {status})")
+                    failures += 1
+                print("  ".join(cells))
+
+    if inexact:
+        print(f"{inexact} run(s) print the same words and numbers as the C++ build, "
+              f"spaced or formatted differently")
+    if mismatches:
+        print(f"{mismatches} run(s) print something other than the C++ build")
+    if args.json:
+        report = {"meta": report_meta(args, cxx=cxx_version, startup_s=startup),
+                  "results": results}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if failures:
+        print(f"FAIL: {failures} generated program(s) exited with an error")
+        return 1
+    return 0
+
+
+def cmd_compare(args):
+    """Compare two suite or runtime --json reports and flag slowdowns."""
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"old: {old['meta'].get('commit')}  new: {new['meta'].get('commit')}")
+
+    regressions = 0
+    for name, after in new["results"].items():
+        before = old["results"].get(name)
+        if before is None or before.get("size") != after.get("size"):
+            print(f"{name:>11}  skipped (not in old report at this size)")
+            continue
+        cells = []
+        for stage in ("lex_s", "parse_s", "generate_s", "run_s"):
+            if stage not in after or stage not in before:
+                continue
+            ratio = after[stage] / before[stage] if before[stage] else 1.0
+            flag = ""
+            if ratio > 1 + args.threshold and after[stage] * 1000 >= args.min_ms:
+                flag = " SLOWER"
+                regressions += 1
+            cells.append(f"{stage[:-2]} x{ratio:.2f}{flag}")
+        print(f"{name:>11}  " + "  ".join(cells))
+
+    if regressions:
+        print(f"FAIL: {regressions} stage(s) slower by more than {args.threshold:.0%}")
+        return 1
+    print("OK: no regressions")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scaling", help=cmd_scaling.__doc__)
+    p.add_argument("--min", type=int, default=1000)
+    p.add_argument("--max", type=int, default=1000000)
+    p.add_argument("--tolerance", type=float, default=3.0,
+                   help="largest allowed growth of the per-item cost")
+    p.set_defaults(func=cmd_scaling)
+
+    p = sub.add_parser("memory", help=cmd_memory.__doc__)
+    p.add_argument("--size", type=int, default=100000, help="statements in main()")
+    p.set_defaults(func=cmd_memory)
+
+    p = sub.add_parser("startup", help=cmd_startup.__doc__)
+    p.add_argument("--runs", type=int, default=10)
+    p.add_argument("--target-ms", type=float, default=45.0,
+                   help="allowed import time on top of the bare interpreter")
+    p.add_argument("--no-optimize", dest="optimize", action="store_false",
+                   help="measure the normal (validating) startup instead")
+    p.set_defaults(func=cmd_startup)
+
+    p = sub.add_parser("tokens", help=cmd_tokens.__doc__)
+    p.add_argument("--size", type=int, default=100000, help="statements in main()")
+    p.set_defaults(func=cmd_tokens)
+
+    p = sub.add_parser("astcache", help=cmd_astcache.__doc__)
+    p.add_argument("--size", type=int, default=100000, help="statements in main()")
+    p.set_defaults(func=cmd_astcache)
+
+    p = sub.add_parser("optimize", help=cmd_optimize.__doc__)
+    p.add_argument("--size", type=int, default=200000, help="loop iterations")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--numpy", action="store_true", help="optimize with numpy=True")
+    p.set_defaults(func=cmd_optimize)
+
+    p = sub.add_parser("io", help=cmd_io.__doc__)
+    p.add_argument("--size", type=int, default=1000000, help="numbers to read")
+    p.set_defaults(func=cmd_io)
+
+    p = sub.add_parser("memoize", help=cmd_memoize.__doc__)
+    p.add_argument("--size", type=int, default=24, help="argument of the recursive calls")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=cmd_memoize)
+
+    p = sub.add_parser("run", help=cmd_run.__doc__)
+    p.add_argument("--programs", type=int, default=500, help="random programs")
+    p.add_argument("--processes", type=int, default=50,
+                   help="programs to run in a new interpreter each")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("parallel", help=cmd_parallel.__doc__)
+    p.add_argument("--size", type=int, default=20000, help="functions in the file")
+    p.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    p.set_defaults(func=cmd_parallel)
+
+    p = sub.add_parser("incremental", help=cmd_incremental.__doc__)
+    p.add_argument("--size", type=int, default=5000, help="functions in the big file")
+    p.set_defaults(func=cmd_incremental)
+
+    p = sub.add_parser("watch", help=cmd_watch.__doc__)
+    p.add_argument("--size", type=int, default=2000, help="functions in the file")
+    p.add_argument("--edits", type=int, default=20)
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("dispatch", help=cmd_dispatch.__doc__)
+    p.add_argument("--only", nargs="+", choices=list(WORKLOADS), help="workloads to run")
+    p.add_argument("--scale", type=float, default=1.0, help="multiply every workload size")
+    p.add_argument("--repeat", type=int, default=5, help="keep the best of this many runs")
+    p.set_defaults(func=cmd_dispatch)
+
+    p = sub.add_parser("suite", help=cmd_suite.__doc__)
+    p.add_argument("--only", nargs="+", choices=list(WORKLOADS), help="workloads to run")
+    p.add_argument("--scale", type=float, default=1.0, help="multiply every workload size")
+    p.add_argument("--repeat", type=int, default=3, help="keep the best of this many runs")
+    p.add_argument("--lexer", choices=("ply", "fast"), default="ply")
+    p.add_argument("--json", metavar="FILE", help="write machine-readable results here")
+    p.add_argument("--emit", metavar="DIR", help="also write the generated .cpp files here")
+    p.set_defaults(func=cmd_suite)
+
+    p = sub.add_parser("runtime", help=cmd_runtime.__doc__)
+    p.add_argument("--json", help="write the report to this file")
+    p.add_argument("--scale", type=float, default=1.0, help="multiply workload sizes")
+    p.add_argument("--repeat", type=int, default=3, help="runs per program (best is kept)")
+    p.add_argument("--options", nargs="+", choices=list(RUNTIME_OPTIONS),
+                   help="option sets to run (default: all)")
+    p.add_argument("--ops", action="store_true",
+                   help="also count the bytecode instructions each program executes (slow)")
+    p.add_argument("--cxx", help="C++ compiler for the baseline (default: g++ or c++)")
+    p.add_argument("--no-cxx", action="store_true", help="skip the C++ baseline")
+    p.set_defaults(func=cmd_runtime)
+
+    p = sub.add_parser("compare", help=cmd_compare.__doc__)
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="relative slowdown that counts as a regression")
+    p.add_argument("--min-ms", type=float, default=1.0,
+                   help="ignore stages faster than this (too noisy to compare)")
+    p.set_defaults(func=cmd_compare)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,173 +1,432 @@
+import io
+import itertools
 from ast_nodes import *
 
-class CodeGenerator:
-    def __init__(self):
+# Keyword options of CodeGenerator, all off by default:
+#   fast_input       read all of stdin at once and split it into tokens, as
+#                    `cin >>` does, instead of calling input() per value
+#   buffered_output  collect `cout` output in memory and write it out in
+#                    large chunks, before reading input and at exit
+#   memoize          cache the results of pure recursive functions (see
+#                    memoizable())
+OPTIONS = ("fast_input", "buffered_output", "memoize")
+
+# Helper code for the options, written once at the top of the program:
+# (modules it imports, lines)
+FAST_INPUT = (("sys",), [
+    "def _tokens():",
+    "    sys.stdout.flush()",
+    "    yield from sys.stdin.buffer.read().split()",
+    "",
+    "_next_token = _tokens().__next__",
+])
+
+BUFFERED_OUTPUT = (("atexit", "sys"), [
+    "_out = []",
+    "",
+    "def _flush():",
+    "    if _out:",
+    "        sys.stdout.write(\"\".join(_out))",
+    "        _out.clear()",
+    "",
+    "def _write(text):",
+    "    _out.append(text)",
+    "    if len(_out) > 8192:",
+    "        _flush()",
+    "",
+    "atexit.register(_flush)",
+])
+
+# typed=True: f(2) and f(2.0) are the same key to functools.cache, but
+# need not print the same thing.
+MEMOIZE = "@functools.lru_cache(maxsize=None, typed=True)"
+
+# Before Python 3.12 a call through lru_cache counts towards the recursion
+# limit as well as the call it wraps, so without twice the default limit
+# memoized recursion could only go half as deep.  (Idempotent, for
+# programs run in-process one after another.)
+MEMOIZE_DEPTH = (("sys",), [
+    "sys.setrecursionlimit(max(sys.getrecursionlimit(), 2000))",
+])
+
+# Functions the optimizer may call that have no side effects
+PURE_BUILTINS = {"len", "range", "sum", "max", "min", "int", "math.prod"}
+
+
+def memoizable(program):
+    """Names of the functions of program that are recursive (directly or
+    through others) and pure: they neither read nor write anything but
+    their parameters and locals, do no I/O, and call pure functions only,
+    so a call's result depends on its arguments alone.  Every parameter
+    type (numbers, bool, char, string) is hashable."""
+    functions = {d.name: d for d in program.declarations if isinstance(d, FunctionNode)}
+    calls = {}
+    pure = set()
+    for name, f in functions.items():
+        nodes = list(walk(f.body))
+        local = {p.name for p in f.params}
+        for n in nodes:
+            if isinstance(n, (DeclarationNode, AssignNode)):
+                local.add(n.name)
+            elif isinstance(n, GeneratorNode):
+                local.add(n.var)
+        calls[name] = {n.name for n in nodes if isinstance(n, CallNode)}
+        if not any(isinstance(n, (PrintNode, InputNode))
+                   or isinstance(n, VarNode) and n.name not in local for n in nodes):
+            pure.add(name)
+
+    # A function is pure only if everything it calls is.
+    changed = True
+    while changed:
+        changed = False
+        for name in list(pure):
+            if any(c not in pure and c not in PURE_BUILTINS and not c.startswith("np.")
+                   for c in calls[name]):
+                pure.discard(name)
+                changed = True
+
+    def recursive(name):
+        seen = set()
+        stack = [c for c in calls[name] if c in functions]
+        while stack:
+            callee = stack.pop()
+            if callee == name:
+                return True
+            if callee not in seen:
+                seen.add(callee)
+                stack.extend(c for c in calls[callee] if c in functions)
+        return False
+
+    return {name for name in pure if name != "main" and recursive(name)}
+
+
+class CodeGenerator(NodeVisitor):
+    """Writes Python source for an AST.
+
+    Statements are written line by line to `out` (any object with a
+    write() method) with their final indentation, so each line is produced
+    exactly once no matter how deeply it is nested.  Expressions are small
+    and are returned as strings.  Each kind of node has a write_<NodeClass>
+    or expr_<NodeClass> method, found by NodeVisitor's dispatch tables.
+    """
+    DISPATCH = {"write": "write_unsupported", "expr": "expr_unsupported"}
+
+    def __init__(self, out=None, fast_input=False, buffered_output=False, memoize=False):
+        self.fast_input = fast_input
+        self.buffered_output = buffered_output
+        self.memoize = memoize
+        self.memoized = set()      # names of functions to decorate with MEMOIZE
         self.indent_level = 0
-        self.symtab = {}           
-        self.functions = []        
+        self.prefix = ""           # indentation of the current block
+        self.symtab = {}
+        self.functions = []
+        self.out = out
+        self.lines = 0             # lines written so far
+        self.at_line_start = True
 
     def indent(self):
         return "    " * self.indent_level
 
-    # Top Level Dispatcher
+    def emit(self, line=""):
+        """Write one line at the current indentation."""
+        if not self.at_line_start:
+            self.out.write("\n")
+        self.out.write(self.prefix + line if line else "")
+        self.at_line_start = False
+        self.lines += 1
+
+    # Entry points
     def generate(self, node):
+        """Return the code for node as a string."""
         if node is None:
             return ""
+        if isinstance(node, (BinOpNode, UnaryOpNode, CallNode, NumNode,
+                             BoolNode, VarNode, StringNode, GeneratorNode,
+                             KeywordNode)):
+            return self.expr(node)
+
+        saved = self.out, self.at_line_start
+        self.out, self.at_line_start = io.StringIO(), True
+        try:
+            self.write(node)
+            return self.out.getvalue()
+        finally:
+            self.out, self.at_line_start = saved
+
+    def generate_to(self, node, out):
+        """Stream the code for node straight to a file-like object."""
+        self.out, self.at_line_start = out, True
+        self.write(node)
+
+    # Statement writer: write_<NodeClass>(node) for each kind of statement
+    def write(self, node):
+        self._write_methods[type(node)](self, node)
+
+    def write_NoneType(self, node):
+        pass
+
+    def write_unsupported(self, node):
+        self.emit(f"# Unsupported node {node}")
+
+    # ------------------ PROGRAM ------------------
+    def write_ProgramNode(self, node):
+        self.write_program(node)
+
+    # ------------------ FUNCTION ------------------
+    def write_FunctionNode(self, node):
+        params = ", ".join(p.name for p in node.params)
+        if node.name in self.memoized:
+            self.emit(MEMOIZE)
+        self.emit(f"def {node.name}({params}):")
 
-        # ------------------ PROGRAM ------------------
-        if isinstance(node, ProgramNode):
-            parts = []
-            for d in node.declarations:
-                if d:
-                    parts.append(self.generate(d))
-
-            # auto-add main() runner
-            if any(isinstance(d, FunctionNode) and d.name == "main"
-                   for d in node.declarations):
-                parts.append('\nif __name__ == "__main__":\n    main()')
-
-            return "\n\n".join(parts)
-
-        # ------------------ FUNCTION ------------------
-        elif isinstance(node, FunctionNode):
-            params = ", ".join(p.name for p in node.params)
-            header = f"def {node.name}({params}):"
-
-            self.indent_level += 1
-            saved = self.symtab.copy()
-
-            for p in node.params:
-                self.symtab[p.name] = p.type_name
-
-            body = self.generate(node.body)
-
-            self.symtab = saved
-            self.indent_level -= 1
-            return header + "\n" + body
-
-        # ------------------ BLOCK ------------------
-        elif isinstance(node, BlockNode):
-            self.indent_level += 1
-            lines = []
+        self.indent_level += 1
+        saved = self.symtab.copy()
 
-            for stmt in node.statements:
-                g = self.generate(stmt)
-                if not g:
-                    continue
+        for p in node.params:
+            self.symtab[p.name] = p.type_name
 
-                for line in g.splitlines():
-                    if line.strip() == "":
-                        lines.append("")
-                    else:
-                        lines.append(self.indent() + line)
+        self.write_body(node.body)
 
-            self.indent_level -= 1
+        self.symtab = saved
+        self.indent_level -= 1
 
-            if not lines:
-                return self.indent() + "pass"
-            return "\n".join(lines)
+    # ------------------ BLOCK ------------------
+    # A block nested directly in another block has no scope of its own
+    # in Python, so its statements are written at the same indentation.
+    def write_BlockNode(self, node):
+        for stmt in node.statements:
+            self.write(stmt)
+
+    # ------------------ DECLARATION ------------------
+    def write_DeclarationNode(self, node):
+        # A declaration without a value (left by the optimizer for a
+        # dead store) only records the type.
+        self.symtab[node.name] = node.type_name
+        if node.value is not None:
+            self.emit(f"{node.name} = {self.expr(node.value)}")
+
+    # ------------------ ASSIGNMENT ------------------
+    def write_AssignNode(self, node):
+        self.emit(f"{node.name} = {self.expr(node.value)}")
+
+    # ------------------ PRINT ------------------
+    def write_PrintNode(self, node):
+        if self.buffered_output:
+            self.write_buffered(node)
+            return
+
+        parts = []
+        had_endl = False
+
+        for expr in node.expr:
+            if isinstance(expr, VarNode) and expr.name == "endl":
+                had_endl = True
+            else:
+                parts.append(self.expr(expr))
 
-        # ------------------ DECLARATION ------------------
-        elif isinstance(node, DeclarationNode):
-            self.symtab[node.name] = node.type_name
-            if node.value:
-                return f"{node.name} = {self.generate(node.value)}"
+        if had_endl:
+            self.emit(f"print({', '.join(parts)})")
+        elif parts:
+            self.emit(f"print({', '.join(parts)}, end='')")
+        else:
+            self.emit("print(end='')")
+
+    # ------------------ INPUT ------------------
+    def write_InputNode(self, node):
+        read = "_next_token()" if self.fast_input else "input()"
+        if self.buffered_output:
+            self.emit("_flush()")
+        for name in node.targets:
+            t = self.symtab.get(name)
+            if t == "INT":
+                self.emit(f"{name} = int({read})")
+            elif t in ("FLOAT", "DOUBLE"):
+                self.emit(f"{name} = float({read})")
+            elif self.fast_input:
+                self.emit(f"{name} = {read}.decode()")
+            else:
+                self.emit(f"{name} = {read}")
+
+    # ------------------ IF ------------------
+    def write_IfNode(self, node):
+        self.emit(f"if {self.expr(node.cond)}:")
+        self.write_body(node.then)
+        if node.else_:
+            self.emit("else:")
+            self.write_body(node.else_)
+
+    # ------------------ WHILE ------------------
+    def write_WhileNode(self, node):
+        self.emit(f"while {self.expr(node.cond)}:")
+        self.write_body(node.body)
+
+    # ------------------ FOR ------------------
+    def write_ForNode(self, node):
+        self.generate_for(node)
+
+    # ------------------ RETURN ------------------
+    def write_ReturnNode(self, node):
+        if node.expr is None:
+            self.emit("return")
+        else:
+            self.emit(f"return {self.expr(node.expr)}")
+
+    def write_ContinueNode(self, node):
+        self.emit("continue")
+
+    def write_program(self, program, functions=None):
+        """Write a whole program.  `functions` maps the index of a
+        declaration to code already generated for it (see
+        generate_parallel)."""
+        prev = self.write_prologue(program)
+        for i, d in enumerate(program.declarations):
+            if d and not isinstance(d, ImportNode):
+                if prev:
+                    self.emit()
+                if functions is not None and i in functions:
+                    self.emit(functions[i])
+                else:
+                    self.write(d)
+                prev = d
+
+        # auto-add main() runner
+        if any(isinstance(d, FunctionNode) and d.name == "main"
+               for d in program.declarations):
+            if prev:
+                self.emit()
+            self.emit()
+            self.emit('if __name__ == "__main__":')
+            self.emit('    main()')
+
+    def write_prologue(self, program):
+        """Write the program's imports and the helpers its options need.
+        Returns True if anything was written."""
+        imports = {(d.module, d.alias) for d in program.declarations
+                   if isinstance(d, ImportNode)}
+        helpers = []
+        if self.fast_input or self.buffered_output:
+            present = {type(n) for n in walk(program)}
+            if self.fast_input and InputNode in present:
+                helpers.append(FAST_INPUT)
+            if self.buffered_output and PrintNode in present:
+                helpers.append(BUFFERED_OUTPUT)
+        if self.memoize:
+            self.memoized = memoizable(program)
+            if self.memoized:
+                imports.add(("functools", None))
+                helpers.append(MEMOIZE_DEPTH)
+        for modules, _ in helpers:
+            imports.update((m, None) for m in modules)
+
+        for module, alias in sorted(imports, key=lambda i: (i[0], i[1] or "")):
+            self.emit(f"import {module} as {alias}" if alias else f"import {module}")
+        for _, lines in helpers:
+            self.emit()
+            for line in lines:
+                self.emit(line)
+        return bool(imports)
+
+    def write_buffered(self, node):
+        """A print statement as one _write() of a %-format.  "%s" % x is
+        str(x), as print() would write it, and plain string literals go
+        straight into the format."""
+        fields = []
+        args = []
+        had_endl = False
+        for expr in node.expr:
+            if isinstance(expr, VarNode) and expr.name == "endl":
+                had_endl = True
+                continue
+            if (isinstance(expr, StringNode) and expr.value.isprintable()
+                    and not any(c in expr.value for c in '%"\\')):
+                fields.append(expr.value)
             else:
-                return f"{node.name} = None"
+                fields.append("%s")
+                args.append(self.expr(expr))
+        text = " ".join(fields) + ("\\n" if had_endl else "")
+        if not text:
+            return
+        if not args:
+            self.emit(f'_write("{text}")')
+        else:
+            values = ", ".join(args) + ("," if len(args) == 1 else "")
+            self.emit(f'_write("{text}" % ({values}))')
 
-        # ------------------ ASSIGNMENT ------------------
-        elif isinstance(node, AssignNode):
-            return f"{node.name} = {self.generate(node.value)}"
+    def write_body(self, node, tail=None):
+        """Write the body of a def/if/while/for one block deeper.
 
-        # ------------------ PRINT ------------------
-        elif isinstance(node, PrintNode):
-            parts = []
-            had_endl = False
+        Each nesting level indents by four spaces per level, on top of the
+        enclosing block's indentation.  `tail` is an extra statement
+        appended to the body (the increment of a while-loop `for`).
+        """
+        saved = self.prefix
+        self.indent_level += 1
+        self.prefix += self.indent()
+        start = self.lines
 
-            for expr in node.expr:
-                if isinstance(expr, VarNode) and expr.name == "endl":
-                    had_endl = True
-                else:
-                    parts.append(self.generate(expr))
+        self.write(node)
+        if tail is not None:
+            self.write(tail)
+        if self.lines == start:
+            self.emit("pass")
 
-            if had_endl:
-                return f"print({', '.join(parts)})"
+        self.indent_level -= 1
+        self.prefix = saved
 
-            if parts:
-                return f"print({', '.join(parts)}, end='')"
-            else:
-                return "print(end='')"
-
-        # ------------------ INPUT ------------------
-        elif isinstance(node, InputNode):
-            lines = []
-            for name in node.targets:
-                t = self.symtab.get(name)
-                if t == "INT":
-                    lines.append(f"{name} = int(input())")
-                elif t in ("FLOAT", "DOUBLE"):
-                    lines.append(f"{name} = float(input())")
-                else:
-                    lines.append(f"{name} = input()")
-            return "\n".join(lines)
-
-        # ------------------ IF ------------------
-        elif isinstance(node, IfNode):
-            code = f"if {self.generate(node.cond)}:\n" + self.generate(node.then)
-            if node.else_:
-                code += f"\nelse:\n" + self.generate(node.else_)
-            return code
-
-        # ------------------ WHILE ------------------
-        elif isinstance(node, WhileNode):
-            return f"while {self.generate(node.cond)}:\n{self.generate(node.body)}"
-
-        # ------------------ FOR ------------------
-        elif isinstance(node, ForNode):
-            return self.generate_for(node)
-
-        # ------------------ RETURN ------------------
-        elif isinstance(node, ReturnNode):
-            if node.expr is None:
-                return "return"
-            return f"return {self.generate(node.expr)}"
-
-        # ------------------ FUNCTION CALL ------------------
-        elif isinstance(node, CallNode):
-            args = ", ".join(self.generate(a) for a in node.args)
-            return f"{node.name}({args})"
-
-        # ------------------ BINARY OP ------------------
-        elif isinstance(node, BinOpNode):
-            op = node.op
-            if op == "&&": op = "and"
-            if op == "||": op = "or"
-            return f"({self.generate(node.left)} {op} {self.generate(node.right)})"
-
-        # ------------------ UNARY OP ------------------
-        elif isinstance(node, UnaryOpNode):
-            if node.op == "!":
-                return f"(not {self.generate(node.expr)})"
-            if node.op == "-":
-                return f"(-{self.generate(node.expr)})"
-            return f"({node.op}{self.generate(node.expr)})"
-
-        # ------------------ LITERALS ------------------
-        elif isinstance(node, NumNode):
-            return str(node.value)
-
-        elif isinstance(node, BoolNode):
-            return "True" if node.value else "False"
-
-        elif isinstance(node, VarNode):
-            return node.name
-
-        elif isinstance(node, StringNode):
-            esc = node.value.replace('"', '\\"')
-            return f"\"{esc}\""
+    # Expressions: expr_<NodeClass>(node) returns the code for each kind
+    def expr(self, node):
+        return self._expr_methods[type(node)](self, node)
 
+    def expr_unsupported(self, node):
         return f"# Unsupported node {node}"
 
+    # ------------------ FUNCTION CALL ------------------
+    def expr_CallNode(self, node):
+        # a lone generator argument needs no parentheses of its own
+        if len(node.args) == 1 and isinstance(node.args[0], GeneratorNode):
+            return f"{node.name}({self.expr(node.args[0])[1:-1]})"
+        args = ", ".join(self.expr(a) for a in node.args)
+        return f"{node.name}({args})"
+
+    # ------------------ GENERATOR ------------------
+    def expr_GeneratorNode(self, node):
+        code = f"{self.expr(node.expr)} for {node.var} in {self.expr(node.iterable)}"
+        if node.cond is not None:
+            code += f" if {self.expr(node.cond)}"
+        return f"({code})"
+
+    def expr_KeywordNode(self, node):
+        return f"{node.name}={self.expr(node.value)}"
+
+    # ------------------ BINARY OP ------------------
+    def expr_BinOpNode(self, node):
+        op = node.op
+        if op == "&&": op = "and"
+        if op == "||": op = "or"
+        return f"({self.expr(node.left)} {op} {self.expr(node.right)})"
+
+    # ------------------ UNARY OP ------------------
+    def expr_UnaryOpNode(self, node):
+        if node.op == "!":
+            return f"(not {self.expr(node.expr)})"
+        if node.op == "-":
+            return f"(-{self.expr(node.expr)})"
+        return f"({node.op}{self.expr(node.expr)})"
+
+    # ------------------ LITERALS ------------------
+    def expr_NumNode(self, node):
+        return str(node.value)
+
+    def expr_BoolNode(self, node):
+        return "True" if node.value else "False"
+
+    def expr_VarNode(self, node):
+        return node.name
+
+    def expr_StringNode(self, node):
+        esc = node.value.replace('"', '\\"')
+        return f"\"{esc}\""
+
     #           FULLY UPDATED FOR LOOP GENERATOR
     def generate_for(self, node):
         init = node.init
@@ -178,10 +437,10 @@ class CodeGenerator:
         # ----------- init -----------
         if isinstance(init, DeclarationNode):
             var = init.name
-            start = self.generate(init.value)
+            start = self.expr(init.value)
         elif isinstance(init, AssignNode):
             var = init.name
-            start = self.generate(init.value)
+            start = self.expr(init.value)
         else:
             return self.generate_fallback_for(node)
 
@@ -193,7 +452,7 @@ class CodeGenerator:
             return self.generate_fallback_for(node)
 
         op = cond.op
-        stop = self.generate(cond.right)  
+        stop = self.expr(cond.right)
 
         # adjust <= and >=
         if op == "<=":
@@ -206,7 +465,7 @@ class CodeGenerator:
 
         if isinstance(incr, AssignNode) and isinstance(incr.value, BinOpNode):
             incop = incr.value.op
-            val = self.generate(incr.value.right)
+            val = self.expr(incr.value.right)
 
             if incop == "+":
                 step = val
@@ -218,27 +477,63 @@ class CodeGenerator:
             step = "-" + step
 
         # ----------- Build final Python loop -----------
-        loop = f"for {var} in range({start}, {stop}, {step}):\n"
-        loop += self.generate(body)
-        return loop
+        self.emit(f"for {var} in range({start}, {stop}, {step}):")
+        self.write_body(body)
 
-    # fallback → while loop 
+    # fallback → while loop
     def generate_fallback_for(self, node):
-        init_code = self.generate(node.init)
-        cond_code = self.generate(node.cond)
-        incr_code = self.generate(node.incr)
-        body_code = self.generate(node.body)
-
-        result = init_code + "\n"
-        result += f"while {cond_code}:\n"
-
-        self.indent_level += 1
-        for line in body_code.splitlines():
-            result += self.indent() + line + "\n"
-        result += self.indent() + incr_code + "\n"
-        self.indent_level -= 1
-
-        return result
+        self.write(node.init)
+        self.emit(f"while {self.expr(node.cond)}:")
+        self.write_body(node.body, tail=node.incr)
+
+
+# ------------------------------
+# Parallel code generation
+# ------------------------------
+# Each function is written with the symbol table it starts from restored
+# afterwards, so functions can be written in any order, by any process.
+# Workers are forked and find the program in _parallel_job, so only lists
+# of declaration indices and the generated text cross process boundaries.
+_parallel_job = None       # (program, options, memoized)
+
+def _generate_functions(indices):
+    program, options, memoized = _parallel_job
+    gen = CodeGenerator(**options)
+    gen.memoized = memoized
+    return [gen.generate(program.declarations[i]) for i in indices]
+
+def generate_parallel(program, workers, **options):
+    """CodeGenerator(**options).generate(program), with the functions
+    written by `workers` processes and stitched together in source order.
+    The output is the same byte for byte.  Falls back to one process for
+    small programs and where processes cannot be forked."""
+    global _parallel_job
+    gen = CodeGenerator(**options)
+    indices = [i for i, d in enumerate(program.declarations) if isinstance(d, FunctionNode)]
+    if workers <= 1 or len(indices) < 2 * workers:
+        return gen.generate(program)
+
+    # Imported here, after the checks above: multiprocessing is slow to
+    # import and most runs never need it.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return gen.generate(program)
+
+    # A few chunks per worker evens out functions of different sizes.
+    size = -(-len(indices) // (workers * 4))
+    chunks = [indices[k:k + size] for k in range(0, len(indices), size)]
+    _parallel_job = (program, options, memoizable(program) if gen.memoize else set())
+    try:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            texts = itertools.chain.from_iterable(pool.map(_generate_functions, chunks))
+            functions = dict(zip(indices, texts))
+    finally:
+        _parallel_job = None
+
+    gen.out, gen.at_line_start = io.StringIO(), True
+    gen.write_program(program, functions)
+    return gen.out.getvalue()
 
 
 # Manual tester
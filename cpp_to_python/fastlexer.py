@@ -0,0 +1,123 @@
+"""Single-pass tokenizer producing the same tokens as lexer.py.
+
+PLY's lexer tries its master regex and then calls a Python function per
+token for most rules.  FastLexer folds every rule, the ignored characters
+and the error case into one regex and scans the input with finditer(), so
+each token costs one match and a dict lookup.
+
+Usage:  parser.parse(data, lexer=FastLexer())
+"""
+import ast as _ast
+import re
+from functools import partial
+
+from lexer import reserved
+
+# Same alternatives, in the same order, as PLY builds from lexer.py:
+# function rules in definition order, then string rules longest first.
+_OPERATORS = [
+    ('PLUSEQ', r'\+\='), ('MINUSEQ', r'\-\='), ('INC', r'\+\+'), ('DEC', r'\-\-'),
+    ('LOR', r'\|\|'), ('SHL', r'<<'), ('SHR', r'>>'), ('PLUS', r'\+'),
+    ('MULT', r'\*'), ('EQ', r'=='), ('NEQ', r'!='), ('LE', r'<='), ('GE', r'>='),
+    ('LPAREN', r'\('), ('RPAREN', r'\)'), ('LBRACE', r'\{'), ('RBRACE', r'\}'),
+    ('LAND', r'&&'), ('MINUS', r'-'), ('DIV', r'/'), ('MOD', r'%'),
+    ('LT', r'<'), ('GT', r'>'), ('ASSIGN', r'='), ('SEMICOLON', r';'),
+    ('COMMA', r','), ('NOT', r'!'),
+]
+
+_OPERATOR_TYPES = {re.sub(r'\\(.)', r'\1', pattern): name for name, pattern in _OPERATORS}
+
+# Ignored characters are folded into the front of every match, and the
+# alternatives are ordered roughly by how common they are.  Only comments
+# and DIV can start at the same character, and comments still come first,
+# so the order does not change the result.  Each alternative is one numbered group.
+# `error` must not match an ignored character: at the end of the input the
+# leading [ \t\r]* would give the last one back to it.
+_RULES = [
+    ('ID', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+    ('comment', r'//.*|/\*(?:[^*]|\*+[^*/])*\*+/'),
+    ('op', '|'.join(pattern for _, pattern in _OPERATORS)),
+    ('NUMBER', r'\d+\.\d+|\d+'),
+    ('newline', r'\n+'),
+    ('STRING_LITERAL', r'\"(?:[^\\\n]|(?:\\.))*?\"'),
+    ('INCLUDE', r'\#include\s*<[^>]+>'),
+    ('error', r'[^ \t\r\n]'),
+]
+
+_MASTER = re.compile(r'[ \t\r]*(?:' + '|'.join(f'({pattern})' for _, pattern in _RULES) + ')')
+
+(_ID, _COMMENT, _OP, _NUMBER, _NEWLINE,
+ _STRING_LITERAL, _INCLUDE, _ERROR) = range(1, len(_RULES) + 1)
+
+
+class Token:
+    """Drop-in for ply.lex.LexToken.  `lexer` is left unset; yacc fills it
+    in on tokens it hands to p_error()."""
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+    def __init__(self, type, value, lineno, lexpos):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+    def __repr__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+
+class FastLexer:
+    """Implements the part of the PLY lexer interface the parser uses:
+    input(), token(), lineno and clone()."""
+
+    def __init__(self):
+        self.lineno = 1
+        self.token = partial(next, iter(()), None)
+
+    def clone(self):
+        return FastLexer()
+
+    def input(self, data):
+        self.token = partial(next, self.scan(data), None)
+
+    def __iter__(self):
+        return iter(self.token, None)
+
+    def scan(self, data, pos=0):
+        """Generate the tokens of data from pos on, updating self.lineno as
+        it goes.  pos must be where a token, or the space before one, starts."""
+        reserved_get = reserved.get
+        operators = _OPERATOR_TYPES
+        lineno = self.lineno
+
+        for m in _MASTER.finditer(data, pos):
+            kind = m.lastindex
+            value = m[kind]
+            if kind == _ID:
+                yield Token(reserved_get(value, 'ID'), value, lineno, m.end() - len(value))
+            elif kind == _OP:
+                yield Token(operators[value], value, lineno, m.end() - len(value))
+            elif kind == _NUMBER:
+                number = float(value) if '.' in value else int(value)
+                yield Token('NUMBER', number, lineno, m.end() - len(value))
+            elif kind == _NEWLINE:
+                lineno += len(value)
+                self.lineno = lineno
+            elif kind == _COMMENT:
+                pass
+            elif kind == _STRING_LITERAL:
+                if '\\' in value:
+                    try:
+                        text = _ast.literal_eval(value)
+                    except Exception:
+                        text = value[1:-1]
+                else:
+                    text = value[1:-1]
+                yield Token('STRING_LITERAL', text, lineno, m.end() - len(value))
+            elif kind == _INCLUDE:
+                yield Token('INCLUDE', value[value.find('<') + 1 : value.rfind('>')],
+                            lineno, m.end() - len(value))
+            else:
+                print(f"Illegal char '{value}' at line {lineno}")
+
+
+def tokenize(data):
+    """List of tokens in data."""
+    return list(FastLexer().scan(data))
@@ -0,0 +1,185 @@
+"""Incremental re-translation of a file that is edited a little at a time.
+
+The source is split into top-level chunks -- an #include, `using namespace
+std;` or a function definition, with the blank lines and comments before
+it -- and each chunk keeps the declarations parsed from it and the code
+generated for its function.  After an edit, the chunks before and after
+the changed text are reused as they are: lexing starts at the end of the
+last unchanged chunk and stops at the first chunk boundary from which the
+rest of the file is unchanged, so only the edited functions are lexed,
+parsed and generated again.
+
+The lexer keeps no state between tokens but the line number, so lexing
+from a chunk boundary gives the tokens a pass over the whole file would;
+and every top-level declaration parses on its own, so the chunks' trees
+put together are the tree of the whole file.  The result is the same as
+translating the whole file (see tests/test_incremental.py).
+"""
+import io
+
+from ast_nodes import *
+from codegen import CodeGenerator, memoizable
+from fastlexer import FastLexer
+from main import TranslationError
+from optimizer import optimize as optimize_ast
+from parser import parser, syntax_errors, TokenListLexer
+
+
+class Chunk:
+    """One top-level declaration and the text before it."""
+    __slots__ = ("text", "lines", "declarations", "code")
+
+    def __init__(self, text, declarations, lines):
+        self.text = text
+        self.lines = lines      # as the lexer counts them: not inside /* */
+        self.declarations = declarations
+        self.code = {}      # memoized or not -> code for its function
+
+
+def parse_chunk(text, tokens):
+    """The declarations in one chunk's tokens."""
+    if not tokens:
+        return []
+    syntax_errors.clear()
+    tree = parser.parse(text, lexer=TokenListLexer(tokens))
+    if syntax_errors or tree is None:
+        raise TranslationError("; ".join(syntax_errors) or "no program found")
+    return tree.declarations
+
+
+class IncrementalTranslator:
+    """Translates successive versions of one file, reusing what an edit
+    left alone.  Takes the options of main.translate().
+
+    With optimize=True only lexing and parsing are incremental: the
+    passes look at the whole program, so the optimized tree, and the code
+    for it, are rebuilt every time.
+    """
+
+    def __init__(self, optimize=False, numpy=False, **codegen_options):
+        self.optimize = optimize
+        self.numpy = numpy
+        self.codegen_options = codegen_options
+        self.chunks = []
+        self.reused = 0         # chunks the last translate() kept
+        self.parsed = 0         # and the ones it lexed and parsed
+
+    def translate(self, cpp_code):
+        """Python source for cpp_code, as main.translate() would give it.
+        Raises TranslationError on syntax errors, keeping the chunks of
+        the last version that translated."""
+        chunks = self.split(cpp_code)
+        program = ProgramNode([d for c in chunks for d in c.declarations])
+        if self.optimize:
+            gen = CodeGenerator(**self.codegen_options)
+            py_code = gen.generate(optimize_ast(program, self.numpy))
+        else:
+            py_code = self.generate(program, chunks)
+        self.chunks = chunks
+        return py_code
+
+    def split(self, source):
+        """The chunks of source, reusing the unchanged ones."""
+        old = self.chunks
+
+        # Unchanged chunks at the start ...
+        chunks = []
+        pos = 0
+        for c in old:
+            if not source.startswith(c.text, pos):
+                break
+            chunks.append(c)
+            pos += len(c.text)
+
+        # ... and at the end, by where they would start in source.
+        suffix = {}
+        end = len(source)
+        for k in range(len(old) - 1, len(chunks) - 1, -1):
+            start = end - len(old[k].text)
+            if start < pos or not source.startswith(old[k].text, start):
+                break
+            suffix[start] = k
+            end = start
+
+        self.reused = len(chunks)
+        self.parsed = 0
+        if pos in suffix:
+            self.reused += len(old) - suffix[pos]
+            return chunks + old[suffix[pos]:]
+
+        lexer = FastLexer()
+        lexer.lineno = line = 1 + sum(c.lines for c in chunks)
+        tokens = []
+        depth = 0
+        for tok in lexer.scan(source, pos):
+            tokens.append(tok)
+            kind = tok.type
+            if kind == "LBRACE":
+                depth += 1
+                continue
+            if kind == "RBRACE":
+                depth = max(depth - 1, 0)
+            elif kind not in ("SEMICOLON", "INCLUDE"):
+                continue
+            if depth:
+                continue
+
+            # The end of a top-level declaration
+            if kind == "INCLUDE":
+                stop = source.index(">", tok.lexpos) + 1
+            else:
+                stop = tok.lexpos + 1
+            text = source[pos:stop]
+            chunks.append(Chunk(text, parse_chunk(text, tokens), tok.lineno - line))
+            self.parsed += 1
+            line = tok.lineno
+            tokens = []
+            pos = stop
+            if pos in suffix:
+                self.reused += len(old) - suffix[pos]
+                return chunks + old[suffix[pos]:]
+
+        # Whatever follows the last declaration
+        if pos < len(source):
+            text = source[pos:]
+            chunks.append(Chunk(text, parse_chunk(text, tokens), lexer.lineno - line))
+            self.parsed += 1
+        return chunks
+
+    def generate(self, program, chunks):
+        """CodeGenerator(...).generate(program), with the code of functions
+        whose chunk was reused taken from the chunk."""
+        gen = CodeGenerator(**self.codegen_options)
+        memoized = memoizable(program) if gen.memoize else set()
+        writer = CodeGenerator(**self.codegen_options)
+        writer.memoized = memoized
+
+        functions = {}
+        i = 0
+        for c in chunks:
+            for d in c.declarations:
+                if isinstance(d, FunctionNode):
+                    key = d.name in memoized
+                    if key not in c.code:
+                        c.code[key] = writer.generate(d)
+                    functions[i] = c.code[key]
+                i += 1
+
+        gen.out, gen.at_line_start = io.StringIO(), True
+        gen.write_program(program, functions)
+        return gen.out.getvalue()
+
+
+# Manual tester: translate a file again every time Enter is pressed.
+if __name__ == "__main__":
+    path = input("File location: ")
+    translator = IncrementalTranslator()
+    while True:
+        with open(path, "r", encoding="utf-8") as f:
+            data = f.read()
+        try:
+            print(translator.translate(data))
+        except TranslationError as e:
+            print("Error:", e)
+        print(f"\n{translator.reused} chunks reused, {translator.parsed} parsed")
+        input("Edit the file and press Enter (Ctrl-C to stop) ")
@@ -1,3 +1,6 @@
+import os
+import sys
+import zlib
 import ply.lex as lex
 import ast as _ast
 
@@ -133,4 +136,39 @@ def t_error(t):
     print(f"Illegal char '{t.value[0]}' at line {t.lineno}")
     t.lexer.skip(1)
 
-lexer = lex.lex()
+# ------------------------------
+# Build
+# ------------------------------
+# Optimized startup (python -O, or CPP2PY_OPTIMIZE=1 in the environment)
+# loads the prebuilt lextab.py/parsetab.py tables without validating the
+# rules and never writes a file.  Normal runs validate the rules and
+# refresh the tables when they are stale, as yacc does for parsetab.py.
+OPTIMIZE = bool(sys.flags.optimize or os.environ.get("CPP2PY_OPTIMIZE"))
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+def rules_signature():
+    """Checksum of this file, stamped into lextab.py to detect stale tables."""
+    with open(__file__, "rb") as f:
+        return zlib.crc32(f.read())
+
+def write_tables():
+    lexer.writetab("lextab", _here)
+    with open(os.path.join(_here, "lextab.py"), "a", encoding="utf-8") as f:
+        f.write(f"_lexsignature = {rules_signature()!r}\n")
+
+try:
+    import lextab
+    _tables_current = getattr(lextab, "_lexsignature", None) == rules_signature()
+except ImportError:
+    _tables_current = False
+
+if OPTIMIZE and _tables_current:
+    lexer = lex.lex(optimize=True, lextab="lextab")
+else:
+    lexer = lex.lex()
+    if not OPTIMIZE and not _tables_current:
+        try:
+            write_tables()
+        except OSError:
+            pass
@@ -0,0 +1,11 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('ASSIGN', 'BOOL', 'CHAR', 'CIN', 'COMMA', 'COUT', 'DEC', 'DIV', 'DOUBLE', 'ELSE', 'EQ', 'FALSE', 'FLOAT', 'FOR', 'GE', 'GT', 'ID', 'IF', 'INC', 'INCLUDE', 'INT', 'LAND', 'LBRACE', 'LE', 'LOR', 'LPAREN', 'LT', 'MAIN', 'MINUS', 'MINUSEQ', 'MOD', 'MULT', 'NAMESPACE', 'NEQ', 'NOT', 'NUMBER', 'PLUS', 'PLUSEQ', 'RBRACE', 'RETURN', 'RPAREN', 'SEMICOLON', 'SHL', 'SHR', 'STD', 'STRING', 'STRING_LITERAL', 'TRUE', 'USING', 'VOID', 'WHILE'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_INCLUDE>\\#include\\s*<[^>]+>)|(?P<t_STRING_LITERAL>\\"([^\\\\\\n]|(\\\\.))*?\\")|(?P<t_NUMBER>\\d+\\.\\d+|\\d+)|(?P<t_ID>[a-zA-Z_][a-zA-Z0-9_]*)|(?P<t_comment_singleline>//.*)|(?P<t_comment_multiline>/\\*([^*]|\\*+[^*/])*\\*+/)|(?P<t_newline>\\n+)|(?P<t_PLUSEQ>\\+\\=)|(?P<t_MINUSEQ>\\-\\=)|(?P<t_INC>\\+\\+)|(?P<t_DEC>\\-\\-)|(?P<t_LOR>\\|\\|)|(?P<t_SHL><<)|(?P<t_SHR>>>)|(?P<t_PLUS>\\+)|(?P<t_MULT>\\*)|(?P<t_EQ>==)|(?P<t_NEQ>!=)|(?P<t_LE><=)|(?P<t_GE>>=)|(?P<t_LPAREN>\\()|(?P<t_RPAREN>\\))|(?P<t_LBRACE>\\{)|(?P<t_RBRACE>\\})|(?P<t_LAND>&&)|(?P<t_MINUS>-)|(?P<t_DIV>/)|(?P<t_MOD>%)|(?P<t_LT><)|(?P<t_GT>>)|(?P<t_ASSIGN>=)|(?P<t_SEMICOLON>;)|(?P<t_COMMA>,)|(?P<t_NOT>!)', [None, ('t_INCLUDE', 'INCLUDE'), ('t_STRING_LITERAL', 'STRING_LITERAL'), None, None, ('t_NUMBER', 'NUMBER'), ('t_ID', 'ID'), ('t_comment_singleline', 'comment_singleline'), ('t_comment_multiline', 'comment_multiline'), None, ('t_newline', 'newline'), (None, 'PLUSEQ'), (None, 'MINUSEQ'), (None, 'INC'), (None, 'DEC'), (None, 'LOR'), (None, 'SHL'), (None, 'SHR'), (None, 'PLUS'), (None, 'MULT'), (None, 'EQ'), (None, 'NEQ'), (None, 'LE'), (None, 'GE'), (None, 'LPAREN'), (None, 'RPAREN'), (None, 'LBRACE'), (None, 'RBRACE'), (None, 'LAND'), (None, 'MINUS'), (None, 'DIV'), (None, 'MOD'), (None, 'LT'), (None, 'GT'), (None, 'ASSIGN'), (None, 'SEMICOLON'), (None, 'COMMA'), (None, 'NOT')])]}
+_lexstateignore = {'INITIAL': ' \t\r'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
+_lexsignature = 2909287372
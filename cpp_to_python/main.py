@@ -1,7 +1,31 @@
+import argparse
+import atexit
+import hashlib
+import json
 import os
 import re
-from parser import parser
-from codegen import CodeGenerator
+import sys
+import traceback
+import tracemalloc
+from lexer import lexer as default_lexer
+from parser import parser, syntax_errors, new_lexer, LEXERS, TokenListLexer
+from codegen import CodeGenerator, generate_parallel, OPTIONS as CODEGEN_OPTIONS
+from astcache import ASTCache
+from optimizer import optimize as optimize_ast
+from ast_nodes import walk
+import metrics as _metrics
+from metrics import FileMetrics, NO_METRICS
+
+MANIFEST_NAME = ".manifest.json"
+
+# Any change to these files changes the translator version and
+# invalidates every cached output.
+TRANSLATOR_MODULES = ("lexer.py", "fastlexer.py", "parser.py", "ast_nodes.py",
+                      "astcache.py", "optimizer.py", "codegen.py")
+
+# Settings that change the generated code, and so are part of the
+# translator version too.
+OUTPUT_SETTINGS = ("optimize", "numpy") + CODEGEN_OPTIONS
 
 # Natural sort key (so test10 comes after test9, not after test1)
 def natural_key(filename):
@@ -10,51 +34,441 @@ def natural_key(filename):
         for text in re.split(r'(\d+)', filename)
     ]
 
-def convert_cpp_to_python(input_path, output_path):
-    """Convert a single C++ file into a Python file."""
-    with open(input_path, "r", encoding="utf-8") as f:
-        cpp_code = f.read()
+def translator_version(settings=None):
+    """Hash of the translator sources and output settings, used as part of
+    every cache key."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for name in TRANSLATOR_MODULES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    settings = settings or DEFAULT_SETTINGS
+    for name in OUTPUT_SETTINGS:
+        h.update(f"{name}={settings[name]!r}".encode())
+    return h.hexdigest()[:16]
+
+def output_name(filename):
+    """Output file name derived from the source name (test3.cpp -> test3.py)."""
+    return os.path.splitext(filename)[0] + ".py"
+
+def load_manifest(output_folder, version=None):
+    """The files listed in the manifest, or {} if it was written by another
+    translator version.  With version=None, whatever version wrote it."""
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if version is not None and manifest.get("version") != version:
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(output_folder, version, files):
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+class TranslationError(Exception):
+    pass
+
+
+def parse_source(cpp_code, lexer=None, metrics=NO_METRICS):
+    """Parse C++ source text into an AST, raising TranslationError on
+    syntax errors.
+
+    When metrics are recorded the source is lexed up front, so that the
+    lex and parse stages can be timed separately.
+    """
+    lexer = lexer or default_lexer
+    lexer.lineno = 1
+
+    syntax_errors.clear()
+    if metrics is NO_METRICS:
+        ast = parser.parse(cpp_code, lexer=lexer)
+    else:
+        with metrics.stage("lex"):
+            lexer.input(cpp_code)
+            tokens = list(iter(lexer.token, None))
+        metrics.count("tokens", len(tokens))
+        with metrics.stage("parse"):
+            ast = parser.parse(cpp_code, lexer=TokenListLexer(tokens))
+    if syntax_errors or ast is None:
+        raise TranslationError("; ".join(syntax_errors) or "no program found")
+    return ast
+
 
+def translate(cpp_code, lexer=None, optimize=False, numpy=False, **codegen_options):
+    """Translate C++ source text into Python source text.  numpy=True lets
+    the optimizer use NumPy; other keyword arguments are CodeGenerator
+    options (see codegen.OPTIONS)."""
     # Parse C++ to AST
-    ast = parser.parse(cpp_code)
+    ast = parse_source(cpp_code, lexer)
+    if optimize:
+        ast = optimize_ast(ast, numpy)
 
     # Generate Python code
-    gen = CodeGenerator()
-    py_code = gen.generate(ast)
+    gen = CodeGenerator(**codegen_options)
+    return gen.generate(ast)
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(py_code)
+
+def generate_measured(ast, output_path, metrics, codegen_options, function_jobs=1):
+    """Write the code for ast to output_path, timing codegen and write."""
+    metrics.count("nodes", sum(1 for _ in walk(ast)))
+    with metrics.stage("codegen"):
+        py_code = generate_parallel(ast, function_jobs, **codegen_options)
+    with metrics.stage("write"):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(py_code)
+    metrics.count("output_bytes", len(py_code.encode("utf-8")))
+
+
+def convert_cpp_to_python(input_path, output_path, metrics=NO_METRICS, optimize=False,
+                          numpy=False, **codegen_options):
+    """Convert a single C++ file into a Python file.
+
+    Pass a metrics.FileMetrics to record time and memory per stage.
+    """
+    with metrics.stage("read"):
+        with open(input_path, "r", encoding="utf-8") as f:
+            cpp_code = f.read()
+
+    if metrics is NO_METRICS:
+        py_code = translate(cpp_code, optimize=optimize, numpy=numpy, **codegen_options)
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(py_code)
+    else:
+        ast = parse_source(cpp_code, metrics=metrics)
+        if optimize:
+            with metrics.stage("optimize"):
+                ast = optimize_ast(ast, numpy)
+        generate_measured(ast, output_path, metrics, codegen_options)
 
     print(f"[OK] Converted: {input_path} -> {output_path}")
 
 
-def main():
-    test_folder = "tests"
-    output_folder = "output"
+def run_code(py_code, filename="<generated>"):
+    """Run translated Python source in this process, as if it were the
+    __main__ script."""
+    namespace = {"__name__": "__main__"}
+    recursion_limit = sys.getrecursionlimit()
+    try:
+        exec(compile(py_code, filename, "exec"), namespace)
+    finally:
+        # --memoize raises the recursion limit for the program, not for
+        # the translator or the programs run after it.
+        sys.setrecursionlimit(recursion_limit)
+        # Buffered output is due now, not when this process exits (after
+        # the output of programs run later).
+        flush = namespace.get("_flush")
+        if flush is not None:
+            atexit.unregister(flush)
+            flush()
+
+
+def run_programs(paths, output_folder, optimize=False, numpy=False, **codegen_options):
+    """Translate each C++ file and run it in this process (--run), without
+    writing the Python source out.  Tracebacks name the file a build
+    would write to output_folder, with the same line numbers."""
+    failed = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            cpp_code = f.read()
+        try:
+            py_code = translate(cpp_code, optimize=optimize, numpy=numpy, **codegen_options)
+        except TranslationError as e:
+            print(f"[FAIL] {path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        filename = os.path.join(output_folder, output_name(os.path.basename(path)))
+        try:
+            run_code(py_code, filename)
+        except Exception:
+            traceback.print_exc()
+            failed += 1
+    return 1 if failed else 0
+
+
+# ------------------------------
+# Batch workers
+# ------------------------------
+# Settings shared by every job in a batch:
+#   lexer      lexer backend, see parser.LEXERS
+#   ast_cache  folder of cached ASTs, or None
+#   metrics    record per-stage metrics for every file (slow)
+#   optimize   run the optimizer.py passes on every AST
+#   numpy      let the optimizer compute loops with NumPy
+#   function_jobs  processes writing the functions of each file
+# plus one boolean per CodeGenerator option.
+DEFAULT_SETTINGS = {"lexer": "ply", "ast_cache": None, "metrics": False,
+                    "optimize": False, "numpy": False, "function_jobs": 1,
+                    **dict.fromkeys(CODEGEN_OPTIONS, False)}
+
+_worker_lexer = None
+_worker_ast_cache = None
+_worker_optimize = False
+_worker_numpy = False
+_worker_function_jobs = 1
+_worker_codegen_options = {}
+
+def _init_worker(settings):
+    # Every worker process tokenizes with its own lexer instance.
+    global _worker_lexer, _worker_ast_cache, _worker_optimize, _worker_numpy
+    global _worker_function_jobs, _worker_codegen_options
+    _worker_lexer = new_lexer(settings["lexer"])
+    _worker_ast_cache = settings["ast_cache"] and ASTCache(settings["ast_cache"])
+    _worker_optimize = settings["optimize"]
+    _worker_numpy = settings["numpy"]
+    _worker_function_jobs = settings["function_jobs"]
+    _worker_codegen_options = {name: settings[name] for name in CODEGEN_OPTIONS}
+    if settings["metrics"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
 
-    # Create output directory if needed
+def load_ast(cpp_code, metrics=NO_METRICS):
+    """Parse cpp_code, or load its AST from the worker's AST cache."""
+    if _worker_ast_cache is None:
+        return parse_source(cpp_code, _worker_lexer, metrics)
+    with metrics.stage("load_ast"):
+        ast = _worker_ast_cache.get(cpp_code)
+    if ast is None:
+        ast = parse_source(cpp_code, _worker_lexer, metrics)
+        _worker_ast_cache.put(cpp_code, ast)
+    return ast
+
+def build_ast(cpp_code, metrics=NO_METRICS):
+    """The AST to generate code from: load_ast(), optimized if asked to."""
+    ast = load_ast(cpp_code, metrics)
+    if _worker_optimize:
+        with metrics.stage("optimize"):
+            ast = optimize_ast(ast, _worker_numpy)
+    return ast
+
+def _convert_job(job):
+    """Translate one (input_path, output_path, cpp_code, metrics) job.
+
+    `metrics` is a FileMetrics already holding the read stage, or None.
+    Returns (error, metrics record): the error message is None on success,
+    so that one bad file never takes down the rest of the batch.
+    """
+    input_path, output_path, cpp_code, metrics = job
+    try:
+        if metrics is None:
+            ast = build_ast(cpp_code)
+            with open(output_path, "w", encoding="utf-8") as f:
+                if _worker_function_jobs > 1:
+                    f.write(generate_parallel(ast, _worker_function_jobs,
+                                              **_worker_codegen_options))
+                else:
+                    CodeGenerator(**_worker_codegen_options).generate_to(ast, f)
+        else:
+            generate_measured(build_ast(cpp_code, metrics), output_path, metrics,
+                              _worker_codegen_options, _worker_function_jobs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    else:
+        error = None
+    return error, metrics and metrics.as_dict()
+
+def run_jobs(jobs, workers, settings):
+    """Run conversion jobs, in a process pool when workers > 1."""
+    if workers <= 1 or len(jobs) <= 1:
+        _init_worker(settings)
+        return [_convert_job(job) for job in jobs]
+
+    # Imported here: multiprocessing is slow to import and most runs
+    # never need it.
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Large chunks keep the per-task IPC overhead low on big batches.
+    chunksize = max(1, len(jobs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(settings,)) as pool:
+        return list(pool.map(_convert_job, jobs, chunksize=chunksize))
+
+
+def build(test_folder, output_folder, force=False, workers=1, settings=None):
+    """Convert every .cpp file in test_folder, skipping unchanged ones.
+
+    The manifest in output_folder maps each source file to the hash of its
+    contents and the output it produced.  A file whose size and mtime match
+    the manifest is skipped without being read; otherwise its contents are
+    hashed and only re-translated if the hash changed.
+
+    Returns (entries, converted, skipped, failed, metrics records); the
+    records are only collected when settings["metrics"] is set.
+    """
     os.makedirs(output_folder, exist_ok=True)
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    if settings["metrics"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    version = translator_version(settings)
+    # A stale manifest cannot be trusted for skipping files, but it still
+    # lists the outputs earlier builds wrote.
+    listed = load_manifest(output_folder)
+    old = {} if force else load_manifest(output_folder, version)
+    files = {}
+    jobs = []
+    pending = []
+    failed = []
+    skipped = 0
 
     # Get only .cpp files and sort them naturally
-    cpp_files = sorted(
-        (f for f in os.listdir(test_folder) if f.endswith(".cpp")),
-        key=natural_key
+    entries = sorted(
+        (e for e in os.scandir(test_folder) if e.name.endswith(".cpp")),
+        key=lambda e: natural_key(e.name)
     )
 
-    if not cpp_files:
-        print("No .cpp files found in 'tests/' folder.")
-        return
+    for entry in entries:
+        output_path = os.path.join(output_folder, output_name(entry.name))
+        prev = old.get(entry.name)
+        output_ok = prev is not None and os.path.exists(output_path)
+        # A file that cannot be read fails on its own, like one that
+        # cannot be translated.
+        try:
+            st = entry.stat()
+            if output_ok and prev["size"] == st.st_size and prev["mtime"] == st.st_mtime_ns:
+                files[entry.name] = prev
+                skipped += 1
+                continue
+            metrics = FileMetrics(entry.path) if settings["metrics"] else None
+            with (metrics or NO_METRICS).stage("read"):
+                with open(entry.path, "rb") as f:
+                    data = f.read()
+            source = data.decode("utf-8")
+        except (OSError, UnicodeDecodeError) as e:
+            failed.append(entry.name)
+            print(f"[FAIL] {entry.path}: {e}")
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+
+        record = {
+            "hash": digest,
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "output": output_name(entry.name),
+        }
+
+        if output_ok and prev["hash"] == digest:
+            files[entry.name] = record
+            skipped += 1
+        else:
+            jobs.append((entry.path, output_path, source, metrics))
+            pending.append((entry.name, record))
+
+    converted = 0
+    records = []
+    results = run_jobs(jobs, workers, settings)
+    for job, (name, record), (error, stats) in zip(jobs, pending, results):
+        if stats is not None:
+            records.append(stats)
+        if error is None:
+            files[name] = record
+            converted += 1
+            print(f"[OK] Converted: {job[0]} -> {job[1]}")
+        else:
+            failed.append(name)
+            print(f"[FAIL] {job[0]}: {error}")
+
+    # Drop outputs whose source file has gone away
+    present = {e.name for e in entries}
+    for name, prev in listed.items():
+        if name not in present:
+            try:
+                os.remove(os.path.join(output_folder, prev["output"]))
+            except OSError:
+                pass
+
+    save_manifest(output_folder, version, files)
+    return entries, converted, skipped, failed, records
+
+
+def report_build(args, entries, converted, skipped, failed, records):
+    """Print the metrics (with --metrics) and the summary of a build, and
+    return the exit status."""
+    if args.metrics:
+        write = _metrics.write_jsonl if args.metrics == "jsonl" else _metrics.write_table
+        if args.metrics_file:
+            with open(args.metrics_file, "w", encoding="utf-8") as f:
+                write(records, f)
+        else:
+            print()
+            write(records, sys.stdout)
+
+    if not entries:
+        print(f"No .cpp files found in '{args.src}/' folder.")
+        return 0
+
+    print(f"\n{converted} converted, {skipped} up to date, {len(failed)} failed.")
+    print(f"Check the '{args.out}/' folder.")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Translate C++ sources to Python.")
+    ap.add_argument("--src", default="tests", help="folder with .cpp files")
+    ap.add_argument("--out", default="output", help="folder for generated .py files")
+    ap.add_argument("--force", action="store_true",
+                    help="ignore the build manifest and convert everything")
+    ap.add_argument("-j", "--jobs", type=int, default=1,
+                    help="number of worker processes (0 = one per CPU)")
+    ap.add_argument("--function-jobs", type=int, default=1, metavar="N",
+                    help="write the functions of each file in N processes "
+                         "(for very large files; same output)")
+    ap.add_argument("--lexer", choices=LEXERS, default="ply",
+                    help="lexer backend (both produce the same tokens)")
+    ap.add_argument("--ast-cache", metavar="DIR",
+                    help="reuse parsed ASTs stored in DIR (keyed by source hash)")
+    ap.add_argument("--watch", action="store_true",
+                    help="after building, translate sources again whenever they change")
+    ap.add_argument("--debounce", type=float, default=50, metavar="MS",
+                    help="with --watch, wait until no file has changed for MS ms")
+    ap.add_argument("--poll", action="store_true",
+                    help="with --watch, poll for changes instead of using inotify")
+    ap.add_argument("--run", nargs="+", metavar="FILE",
+                    help="translate FILEs and run them in this process instead of building")
+    ap.add_argument("-O", "--optimize", action="store_true",
+                    help="fold constants and simplify expressions before generating code")
+    ap.add_argument("--numpy", action="store_true",
+                    help="with -O, compute simple counted loops with NumPy arrays "
+                         "(generated programs then need numpy)")
+    ap.add_argument("--fast-input", action="store_true",
+                    help="generated programs read stdin in one go and split it into "
+                         "whitespace-separated tokens, like cin")
+    ap.add_argument("--buffered-output", action="store_true",
+                    help="generated programs collect cout output and write it in large chunks")
+    ap.add_argument("--memoize", action="store_true",
+                    help="cache the results of recursive functions without side effects")
+    ap.add_argument("--metrics", choices=("jsonl", "table"),
+                    help="report time and peak memory per stage for each converted file")
+    ap.add_argument("--metrics-file", metavar="PATH",
+                    help="write the metrics report to PATH instead of stdout")
+    args = ap.parse_args(argv)
+    if args.numpy and not args.optimize:
+        ap.error("--numpy needs -O")
 
-    # Convert each file in correct order
-    for index, filename in enumerate(cpp_files, start=1):
-        input_path = os.path.join(test_folder, filename)
-        output_path = os.path.join(output_folder, f"output{index}.py")
+    if args.run:
+        return run_programs(args.run, args.out, optimize=args.optimize, numpy=args.numpy,
+                            **{name: getattr(args, name) for name in CODEGEN_OPTIONS})
 
-        convert_cpp_to_python(input_path, output_path)
+    settings = {"lexer": args.lexer, "ast_cache": args.ast_cache,
+                "function_jobs": args.function_jobs,
+                "metrics": bool(args.metrics), "optimize": args.optimize,
+                "numpy": args.numpy, "fast_input": args.fast_input,
+                "buffered_output": args.buffered_output, "memoize": args.memoize}
+    workers = args.jobs or os.cpu_count() or 1
+    if args.watch:
+        # Imported here: watch.py imports this module.
+        from watch import watch
+        return watch(args.src, args.out, settings, args.debounce / 1000, args.poll,
+                     force=args.force, workers=workers,
+                     report=lambda *result: report_build(args, *result))
 
-    print("\nAll files converted successfully!")
-    print("Check the 'output/' folder.")
+    return report_build(args, *build(args.src, args.out, force=args.force,
+                                     workers=workers, settings=settings))
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Opt-in per-file instrumentation for batch translation.
+
+A FileMetrics records, for each stage of one translation (read, lex,
+parse, codegen, write), the wall time and the peak memory allocated while
+it ran, plus a few counters (tokens, AST nodes, output size).  Memory is
+measured with tracemalloc, which must be started by the caller and slows
+Python down noticeably, so none of this runs unless asked for.
+
+Code that is always instrumented calls NO_METRICS, whose stage() and
+count() do nothing.
+"""
+import contextlib
+import json
+import time
+import tracemalloc
+
+STAGES = ("read", "lex", "parse", "load_ast", "optimize", "codegen", "write")
+
+
+class FileMetrics:
+    def __init__(self, path):
+        self.path = path
+        self.stages = {}
+        self.counts = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base if tracing else None
+            self.stages[name] = {"s": elapsed, "peak_bytes": peak}
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def as_dict(self):
+        return {"file": self.path, "stages": self.stages, **self.counts}
+
+
+class _NoMetrics:
+    _null = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null
+
+    def count(self, name, value):
+        pass
+
+NO_METRICS = _NoMetrics()
+
+
+# ------------------------------
+# Reports
+# ------------------------------
+def write_jsonl(records, out):
+    for record in records:
+        out.write(json.dumps(record) + "\n")
+
+def write_table(records, out):
+    """Totals per stage for the whole batch, then the counters."""
+    records = list(records)
+    out.write(f"{len(records)} files\n")
+    out.write(f"{'stage':<10}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'max peak MB':>13}\n")
+    for name in STAGES:
+        runs = [r["stages"][name] for r in records if name in r["stages"]]
+        if not runs:
+            continue
+        times = [run["s"] for run in runs]
+        peaks = [run["peak_bytes"] for run in runs if run["peak_bytes"] is not None]
+        peak = f"{max(peaks) / 1e6:13.2f}" if peaks else f"{'-':>13}"
+        out.write(f"{name:<10}{sum(times):10.3f}{sum(times) / len(times) * 1000:10.2f}"
+                  f"{max(times) * 1000:10.2f}{peak}\n")
+    for counter in ("tokens", "nodes", "output_bytes"):
+        values = [r[counter] for r in records if counter in r]
+        if values:
+            out.write(f"{counter:<14}{sum(values):>12} total{max(values):>12} max\n")
@@ -0,0 +1,942 @@
+"""AST optimizations run between parsing and code generation (main.py -O).
+
+optimize() takes a ProgramNode and returns a new one; the tree it is given
+is left untouched, since it may be shared (with the AST cache, say).
+
+A rewrite may never change what the generated program prints, so rewrites
+are checked against what the generated *Python* computes, which is not
+always what the C++ declaration says: after `x = a / b` a variable
+declared `int` holds a float.  Each variable is therefore given the kind
+of value it can hold at run time -- "int", "float", "num" (int or float),
+"bool" or None (unknown) -- starting from its declared type and widened by
+every value stored into it.
+"""
+import math
+from ast_nodes import *
+
+# Kind of value held by a variable of each C++ type, before widening.
+TYPE_KINDS = {"INT": "int", "FLOAT": "float", "DOUBLE": "float", "BOOL": "bool"}
+
+NUMERIC = ("int", "float", "num")
+COMPARISONS = ("<", ">", "<=", ">=", "==", "!=")
+NEGATED = {"<": ">=", ">=": "<", ">": "<=", "<=": ">", "==": "!=", "!=": "=="}
+
+
+def optimize(program, numpy=False):
+    """Apply every pass to a ProgramNode.  With numpy=True, reductions
+    without a closed form are computed with NumPy (see loop_idioms)."""
+    return tail_calls(loop_idioms(eliminate_dead_code(fold_constants(program)), numpy))
+
+
+# ------------------------------
+# Value kinds
+# ------------------------------
+def join(a, b):
+    """The kind of a variable that may hold values of kind a or b."""
+    if a == b:
+        return a
+    if a in NUMERIC and b in NUMERIC:
+        return "num"
+    return None
+
+def kind_of(node, kinds, returns):
+    """Kind of the value of an expression, given the kinds of variables
+    and of function results."""
+    if isinstance(node, NumNode):
+        return "float" if isinstance(node.value, float) else "int"
+    if isinstance(node, BoolNode):
+        return "bool"
+    if isinstance(node, VarNode):
+        return kinds.get(node.name)
+    if isinstance(node, CallNode):
+        return returns.get(node.name)
+    if isinstance(node, UnaryOpNode):
+        if node.op == "!":
+            return "bool"
+        k = kind_of(node.expr, kinds, returns)
+        return k if k in NUMERIC else None
+    if isinstance(node, BinOpNode):
+        if node.op in COMPARISONS:
+            return "bool"
+        left = kind_of(node.left, kinds, returns)
+        right = kind_of(node.right, kinds, returns)
+        if node.op in ("&&", "||"):
+            # Python's `and`/`or` give back one of their operands
+            return join(left, right)
+        if left not in NUMERIC or right not in NUMERIC:
+            return None
+        if node.op == "/" or "float" in (left, right):
+            return "float"
+        return "int" if left == right == "int" else "num"
+    return None
+
+def infer_kinds(program):
+    """Kinds of the variables of every function, and of every function's
+    result: ({FunctionNode: {name: kind}}, {function name: kind})."""
+    functions = [d for d in program.declarations if isinstance(d, FunctionNode)]
+    by_name = {}
+    for f in functions:
+        by_name.setdefault(f.name, []).append(f)
+
+    kinds = {}
+    returns = {}
+    for f in functions:
+        declared = kinds[f] = {}
+        for name, type_name in ([(p.name, p.type_name) for p in f.params] +
+                                [(n.name, n.type_name) for n in walk(f.body)
+                                 if isinstance(n, DeclarationNode)]):
+            kind = TYPE_KINDS.get(type_name)
+            declared[name] = kind if declared.get(name, kind) == kind else None
+        # cin reads an int or a float into variables of those types and a
+        # string into any other (see CodeGenerator.write_InputNode).
+        for node in walk(f.body):
+            if isinstance(node, InputNode):
+                for name in node.targets:
+                    if declared.get(name) not in ("int", "float"):
+                        declared[name] = None
+        kind = TYPE_KINDS.get(f.ret_type)
+        returns[f.name] = kind if returns.get(f.name, kind) == kind else None
+
+    # Every value stored into a variable or returned from a function:
+    # (kinds it goes to, name, value, kinds it is evaluated with)
+    stores = []
+    for f in functions:
+        for node in walk(f.body):
+            if isinstance(node, AssignNode) or (
+                    isinstance(node, DeclarationNode) and node.value is not None):
+                stores.append((kinds[f], node.name, node.value, kinds[f]))
+            elif isinstance(node, ReturnNode):
+                stores.append((returns, f.name, node.expr, kinds[f]))
+            elif isinstance(node, CallNode):
+                callees = by_name.get(node.name, ())
+                for callee in callees:
+                    if len(callees) > 1 or len(callee.params) != len(node.args):
+                        for p in callee.params:
+                            kinds[callee][p.name] = None
+                        continue
+                    for p, arg in zip(callee.params, node.args):
+                        stores.append((kinds[callee], p.name, arg, kinds[f]))
+
+    # Widen until nothing changes; kinds only ever move towards None.
+    changed = True
+    while changed:
+        changed = False
+        for target, name, value, scope in stores:
+            old = target.get(name)
+            new = join(old, kind_of(value, scope, returns))
+            if new != old:
+                target[name] = new
+                changed = True
+    return kinds, returns
+
+
+# ------------------------------
+# Constant folding
+# ------------------------------
+def fold_constants(program):
+    """Fold constant subexpressions and apply algebraic identities."""
+    kinds, returns = infer_kinds(program)
+    return ProgramNode([
+        ConstantFolder(kinds[d], returns).function(d) if isinstance(d, FunctionNode) else d
+        for d in program.declarations
+    ])
+
+def is_number(node):
+    return isinstance(node, NumNode)
+
+def is_int(node, value=None):
+    return (isinstance(node, NumNode) and type(node.value) is int
+            and (value is None or node.value == value))
+
+def is_pure(node):
+    """True if evaluating node has no side effects: it calls no function
+    and cannot divide by zero."""
+    return not any(isinstance(n, CallNode) or
+                   (isinstance(n, BinOpNode) and n.op in ("/", "%"))
+                   for n in walk(node))
+
+def offset(node, k):
+    """node + k, for an int k."""
+    if k > 0:
+        return BinOpNode("+", node, NumNode(k))
+    if k < 0:
+        return BinOpNode("-", node, NumNode(-k))
+    return node
+
+def split_offset(node):
+    """(x, k) such that node is x + k with k an int literal, else (node, 0)."""
+    if isinstance(node, BinOpNode) and node.op in ("+", "-") and is_int(node.right):
+        return node.left, node.right.value if node.op == "+" else -node.right.value
+    return node, 0
+
+def fold_numbers(op, a, b):
+    """The node for `a op b` on two number literals, or None if it must be
+    left to run time."""
+    if op == "+":
+        value = a + b
+    elif op == "-":
+        value = a - b
+    elif op == "*":
+        value = a * b
+    elif op == "/":
+        # int / int is true division in the generated code but not in C++,
+        # so leave it where it can be seen.
+        if b == 0 or (type(a) is int and type(b) is int):
+            return None
+        value = a / b
+    elif op == "%":
+        # C++ and Python disagree on the sign of negative remainders.
+        if type(a) is not int or type(b) is not int or a < 0 or b <= 0:
+            return None
+        value = a % b
+    elif op == "<":
+        return BoolNode(a < b)
+    elif op == ">":
+        return BoolNode(a > b)
+    elif op == "<=":
+        return BoolNode(a <= b)
+    elif op == ">=":
+        return BoolNode(a >= b)
+    elif op == "==":
+        return BoolNode(a == b)
+    elif op == "!=":
+        return BoolNode(a != b)
+    else:
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return NumNode(value)
+
+
+class ConstantFolder:
+    def __init__(self, kinds, returns):
+        self.kinds = kinds
+        self.returns = returns
+
+    def kind(self, node):
+        return kind_of(node, self.kinds, self.returns)
+
+    def function(self, node):
+        return FunctionNode(node.ret_type, node.name, node.params, self.stmt(node.body))
+
+    # Statements
+    def stmt(self, node):
+        if isinstance(node, BlockNode):
+            return BlockNode([self.stmt(s) for s in node.statements])
+        elif isinstance(node, DeclarationNode):
+            return DeclarationNode(node.type_name, node.name, self.expr(node.value))
+        elif isinstance(node, AssignNode):
+            return AssignNode(node.name, self.expr(node.value))
+        elif isinstance(node, PrintNode):
+            return PrintNode([self.expr(e) for e in node.expr])
+        elif isinstance(node, IfNode):
+            return IfNode(self.expr(node.cond), self.stmt(node.then), self.stmt(node.else_))
+        elif isinstance(node, WhileNode):
+            return WhileNode(self.expr(node.cond), self.stmt(node.body))
+        elif isinstance(node, ForNode):
+            return ForNode(self.stmt(node.init), self.expr(node.cond),
+                           self.stmt(node.incr), self.stmt(node.body))
+        elif isinstance(node, ReturnNode):
+            return ReturnNode(self.expr(node.expr))
+        return node
+
+    # Expressions
+    def expr(self, node):
+        if isinstance(node, BinOpNode):
+            return self.binop(node.op, self.expr(node.left), self.expr(node.right))
+        elif isinstance(node, UnaryOpNode):
+            return self.unary(node.op, self.expr(node.expr))
+        elif isinstance(node, CallNode):
+            return CallNode(node.name, [self.expr(a) for a in node.args])
+        return node
+
+    def binop(self, op, left, right):
+        # ----------- constants -----------
+        if is_number(left) and is_number(right):
+            folded = fold_numbers(op, left.value, right.value)
+            if folded is not None:
+                return folded
+
+        # `and`/`or` with a literal on the left: Python never evaluates the
+        # right side, or returns it as it is.
+        if op in ("&&", "||") and isinstance(left, (NumNode, BoolNode)):
+            return right if bool(left.value) == (op == "&&") else left
+
+        lk, rk = self.kind(left), self.kind(right)
+
+        # ----------- identities -----------
+        if op == "+":
+            if is_int(right, 0) and lk == "int":
+                return left
+            if is_int(left, 0) and rk == "int":
+                return right
+        elif op == "-":
+            if is_int(right, 0) and lk in NUMERIC:
+                return left
+            if (isinstance(left, VarNode) and isinstance(right, VarNode)
+                    and left.name == right.name and lk == "int"):
+                return NumNode(0)
+        elif op == "*":
+            if is_int(right, 1) and lk in NUMERIC:
+                return left
+            if is_int(left, 1) and rk in NUMERIC:
+                return right
+            if is_int(right, 0) and lk == "int" and is_pure(left):
+                return right
+            if is_int(left, 0) and rk == "int" and is_pure(right):
+                return left
+        elif op == "/":
+            if is_number(right) and right.value == 1 and lk == "float":
+                return left
+
+        # ----------- (x + c1) + c2 -> x + (c1 + c2) -----------
+        if op in ("+", "-") and is_int(right) and lk == "int":
+            base, k = split_offset(left)
+            if k:
+                return offset(base, k + (right.value if op == "+" else -right.value))
+
+        # ----------- comparisons -----------
+        if op in COMPARISONS and op not in ("==", "!=") and lk == rk == "int":
+            op, left, right = tighten(op, left, right)
+
+        return BinOpNode(op, left, right)
+
+    def unary(self, op, operand):
+        if op == "-":
+            if is_number(operand):
+                return NumNode(-operand.value)
+            if (isinstance(operand, UnaryOpNode) and operand.op == "-"
+                    and self.kind(operand.expr) in NUMERIC):
+                return operand.expr
+        elif op == "!":
+            if isinstance(operand, (NumNode, BoolNode)):
+                return BoolNode(not operand.value)
+            if (isinstance(operand, UnaryOpNode) and operand.op == "!"
+                    and self.kind(operand.expr) == "bool"):
+                return operand.expr
+            if isinstance(operand, BinOpNode) and operand.op in NEGATED:
+                # Only ints are totally ordered (NaN is not)
+                ordered = operand.op in ("==", "!=") or (
+                    self.kind(operand.left) == self.kind(operand.right) == "int")
+                if ordered:
+                    return BinOpNode(NEGATED[operand.op], operand.left, operand.right)
+        return UnaryOpNode(op, operand)
+
+
+def tighten(op, left, right):
+    """Rewrite an int comparison so that neither side adds or subtracts 1,
+    and a literal bound is exclusive: `i < n + 1` -> `i <= n`,
+    `i <= 9` -> `i < 10`."""
+    base, k = split_offset(right)
+    if (op, k) in (("<", 1), ("<=", -1), (">", -1), (">=", 1)):
+        return {"<": "<=", "<=": "<", ">": ">=", ">=": ">"}[op], left, base
+    base, k = split_offset(left)
+    if (op, k) in (("<", -1), ("<=", 1), (">", 1), (">=", -1)):
+        return {"<": "<=", "<=": "<", ">": ">=", ">=": ">"}[op], base, right
+    if is_int(right) and op == "<=":
+        return "<", left, NumNode(right.value + 1)
+    if is_int(right) and op == ">=":
+        return ">", left, NumNode(right.value - 1)
+    return op, left, right
+
+
+# ------------------------------
+# Dead code
+# ------------------------------
+# Liveness is computed on the structured tree directly.  Every statement
+# has a summary (gen, kill): the variables it may read before writing
+# them, and those it always writes.  A loop body runs any number of times,
+# so what is live at the top of a loop is what is live after it, plus what
+# its condition and body may read: after | uses(cond) | gen(body).
+def eliminate_dead_code(program):
+    """Remove unreachable statements, dead stores and unused declarations."""
+    return ProgramNode([
+        FunctionNode(d.ret_type, d.name, d.params, dead_code(d.body, frozenset())[0])
+        if isinstance(d, FunctionNode) else d
+        for d in program.declarations
+    ])
+
+def uses(node):
+    """Names of the variables an expression (or statement) reads."""
+    return {n.name for n in walk(node) if isinstance(n, VarNode)}
+
+def is_literal(node):
+    return isinstance(node, (NumNode, BoolNode))
+
+def is_empty(node):
+    return node is None or (isinstance(node, BlockNode) and not node.statements)
+
+def terminates(node):
+    """True if control never runs past the end of node."""
+    if isinstance(node, (ReturnNode, ContinueNode)):
+        return True
+    if isinstance(node, BlockNode):
+        return any(terminates(s) for s in node.statements)
+    if isinstance(node, IfNode):
+        if is_literal(node.cond):
+            return terminates(node.then if node.cond.value else node.else_)
+        return terminates(node.then) and terminates(node.else_)
+    if isinstance(node, WhileNode):
+        # There is no `break`, so `while (true)` is only left by returning.
+        return is_literal(node.cond) and bool(node.cond.value)
+    return False
+
+def summary(node):
+    """(gen, kill) of a statement.  Returns are treated as falling through,
+    which only makes more variables live."""
+    if isinstance(node, BlockNode):
+        gen, kill = set(), set()
+        for stmt in node.statements:
+            g, k = summary(stmt)
+            gen |= g - kill
+            kill |= k
+        return gen, kill
+    if isinstance(node, (DeclarationNode, AssignNode)):
+        return uses(node.value), {node.name}
+    if isinstance(node, InputNode):
+        return set(), set(node.targets)
+    if isinstance(node, IfNode):
+        gt, kt = summary(node.then)
+        ge, ke = summary(node.else_)
+        return uses(node.cond) | gt | ge, kt & ke
+    if isinstance(node, (WhileNode, ForNode)):
+        # The loop may not run at all, and a range() loop leaves its
+        # variable unset when the range is empty, so nothing is killed.
+        return uses(node), set()
+    if node is None:
+        return set(), set()
+    return uses(node), set()
+
+def loop_live(node, after):
+    """Variables live at the top of a while or for loop (and at the end of
+    its body)."""
+    if isinstance(node, WhileNode):
+        return after | uses(node.cond) | summary(node.body)[0]
+    return after | uses(node.cond) | uses(node.incr) | {node.init.name} | summary(node.body)[0]
+
+def dead_code(node, after):
+    """(node without dead code, variables live before it), given the
+    variables live after it.  The node may come back None."""
+    # ------------------ BLOCK ------------------
+    if isinstance(node, BlockNode):
+        statements = []
+        for stmt in node.statements:
+            statements.append(stmt)
+            if terminates(stmt):
+                break
+        kept = []
+        live = after
+        for stmt in reversed(statements):
+            stmt, live = dead_code(stmt, live)
+            if stmt is not None:
+                kept.append(stmt)
+        kept.reverse()
+        return BlockNode(kept), live
+
+    # ------------------ STORES ------------------
+    # A dead declaration keeps its type, which code generation still
+    # needs (for `cin >>`), but loses its value.
+    elif isinstance(node, DeclarationNode):
+        if node.value is None:
+            return node, after
+        if node.name not in after and is_pure(node.value):
+            return DeclarationNode(node.type_name, node.name, None), after
+        return node, (after - {node.name}) | uses(node.value)
+
+    elif isinstance(node, AssignNode):
+        if node.name not in after and is_pure(node.value):
+            return None, after
+        return node, (after - {node.name}) | uses(node.value)
+
+    elif isinstance(node, InputNode):
+        return node, after - set(node.targets)
+
+    elif isinstance(node, ReturnNode):
+        return node, frozenset(uses(node.expr)) if node.expr is not None else frozenset()
+
+    # ------------------ IF ------------------
+    elif isinstance(node, IfNode):
+        if is_literal(node.cond):
+            return dead_code(node.then if node.cond.value else node.else_, after)
+        then, live_then = dead_code(node.then, after)
+        else_, live_else = dead_code(node.else_, after)
+        if is_empty(then) and is_empty(else_) and is_pure(node.cond):
+            return None, after
+        if is_empty(else_):
+            else_ = None
+        return IfNode(node.cond, then, else_), uses(node.cond) | live_then | live_else
+
+    # ------------------ LOOPS ------------------
+    elif isinstance(node, WhileNode):
+        if is_literal(node.cond) and not node.cond.value:
+            return None, after
+        live = loop_live(node, after)
+        return WhileNode(node.cond, dead_code(node.body, live)[0]), live
+
+    elif isinstance(node, ForNode):
+        if is_literal(node.cond) and not node.cond.value:
+            return dead_code(node.init, after)
+        live = loop_live(node, after)
+        body = dead_code(node.body, live)[0]
+        return ForNode(node.init, node.cond, node.incr, body), live | uses(node.init)
+
+    elif node is None:
+        return None, after
+
+    # PRINT and anything else: keep, and everything it reads is live
+    return node, after | uses(node)
+
+
+# ------------------------------
+# Loop idioms
+# ------------------------------
+# A counted loop whose body is a single accumulation is replaced by one
+# assignment computing the same value:
+#
+#     s = s + E        ->  s = s + <closed form>      E a polynomial in i of
+#                                                     degree <= 2
+#                      ->  s = s + sum(E for i in range(...))
+#     p = p * E        ->  p = p * E ** n  or  p * math.prod(E for ...)
+#     if (C) s = s + E ->  s = s + sum(E for i in range(...) if C)
+#     if (E > m) m = E ->  m = max(m, max((E for ...), default=m))
+#
+# Only int accumulators qualify (sums of floats depend on the order of
+# additions), and only loops that code generation would turn into a
+# range(), with a declared loop variable that the body leaves alone.
+#
+# With numpy=True the sum(), math.prod() and max()/min() forms become
+# NumPy reductions over _i = np.arange(...) when E (and C) are built from
+# + - *, % by a constant and comparisons of ints alone, so that they can be
+# computed element-wise:
+#
+#     s = s + E        ->  s = s + int(np.sum(E))
+#     if (C) s = s + E ->  s = s + int(np.sum(np.where(C, E, 0)))
+#     p = p * E        ->  p = p * int(np.prod(E))
+#     if (E > m) m = E ->  m = int(np.max(E, initial=m))
+#
+# NumPy works in int64, where Python ints never overflow.  Every value
+# involved is a C++ `int`, and C++ leaves overflowing an int undefined, so
+# a program whose result is defined has partial results well within int64;
+# int64 arithmetic wraps around, so the order NumPy sums in cannot change
+# the result either.  The whole range is held in memory at once.
+def loop_idioms(program, numpy=False):
+    """Replace accumulation loops with builtins or closed forms."""
+    kinds, returns = infer_kinds(program)
+    functions = {d.name for d in program.declarations if isinstance(d, FunctionNode)}
+    imports = set()
+    declarations = []
+    for d in program.declarations:
+        if isinstance(d, FunctionNode):
+            shadowed = functions | {p.name for p in d.params} | {
+                n.name for n in walk(d.body)
+                if isinstance(n, (DeclarationNode, AssignNode, VarNode))}
+            idioms = LoopIdioms(kinds[d], returns, shadowed, numpy)
+            d = FunctionNode(d.ret_type, d.name, d.params, idioms.stmt(d.body))
+            imports |= idioms.imports
+        declarations.append(d)
+    return ProgramNode([ImportNode(*m) for m in sorted(imports)] + declarations)
+
+def range_bounds(node):
+    """(var, start, stop, step) of the range() code generation turns a for
+    loop into, or None if it is not a plain counted loop."""
+    init, cond, incr = node.init, node.cond, node.incr
+    if not isinstance(init, DeclarationNode) or init.value is None:
+        return None
+    var = init.name
+    if not (isinstance(cond, BinOpNode) and cond.op in ("<", "<=", ">", ">=")
+            and isinstance(cond.left, VarNode) and cond.left.name == var):
+        return None
+    if not (isinstance(incr, AssignNode) and incr.name == var
+            and isinstance(incr.value, BinOpNode) and incr.value.op in ("+", "-")
+            and isinstance(incr.value.left, VarNode) and incr.value.left.name == var
+            and is_int(incr.value.right) and incr.value.right.value > 0):
+        return None
+    up = incr.value.op == "+"
+    if up != (cond.op in ("<", "<=")):
+        return None
+    stop = cond.right
+    if cond.op == "<=":
+        stop = BinOpNode("+", stop, NumNode(1))
+    elif cond.op == ">=":
+        stop = BinOpNode("-", stop, NumNode(1))
+    step = incr.value.right.value
+    return var, init.value, stop, NumNode(step if up else -step)
+
+def terms(node, sign=1):
+    """The signed terms of a chain of + and -: [(1 or -1, term), ...]."""
+    if isinstance(node, BinOpNode) and node.op in ("+", "-"):
+        return terms(node.left, sign) + terms(node.right, sign if node.op == "+" else -sign)
+    return [(sign, node)]
+
+def same(a, b):
+    return repr(a) == repr(b)
+
+# Builders for closed forms, whose operands are always pure
+def _add(a, b):
+    if is_int(a, 0):
+        return b
+    if is_int(b, 0):
+        return a
+    return BinOpNode("+", a, b)
+
+def _sub(a, b):
+    return a if is_int(b, 0) else BinOpNode("-", a, b)
+
+def _mul(a, b):
+    if is_int(a, 0) or is_int(b, 0):
+        return NumNode(0)
+    if is_int(a, 1):
+        return b
+    if is_int(b, 1):
+        return a
+    if is_int(a) and is_int(b):
+        return NumNode(a.value * b.value)
+    return BinOpNode("*", a, b)
+
+def polynomial(node, var):
+    """Coefficients [c0, c1, c2] of node as a polynomial in var (of degree
+    two at most), or None."""
+    if var not in uses(node):
+        return [node]
+    if isinstance(node, VarNode):
+        return [NumNode(0), NumNode(1)]
+    if isinstance(node, UnaryOpNode) and node.op == "-":
+        p = polynomial(node.expr, var)
+        return p and [_sub(NumNode(0), c) for c in p]
+    if isinstance(node, BinOpNode) and node.op in ("+", "-", "*"):
+        a = polynomial(node.left, var)
+        b = polynomial(node.right, var)
+        if a is None or b is None:
+            return None
+        if node.op == "*":
+            if len(a) + len(b) > 4:
+                return None
+            p = [NumNode(0)] * (len(a) + len(b) - 1)
+            for i, x in enumerate(a):
+                for j, y in enumerate(b):
+                    p[i + j] = _add(p[i + j], _mul(x, y))
+            return p
+        combine = _add if node.op == "+" else _sub
+        p = [NumNode(0)] * max(len(a), len(b))
+        for i in range(len(p)):
+            p[i] = combine(a[i] if i < len(a) else NumNode(0),
+                           b[i] if i < len(b) else NumNode(0))
+        return p
+    return None
+
+def fresh(name, taken):
+    """name, or name followed by a number, whichever is not in taken."""
+    return next(n for n in (name, *(f"{name}{i}" for i in range(1, len(taken) + 2)))
+                if n not in taken)
+
+def power_sums(n, start, step):
+    """sum(i ** k for i in range(start, stop, step)) for k = 0, 1, 2, as
+    expressions, n being the number of terms.  With i = start + step*j:
+        sum(1)   = n
+        sum(i)   = n*start + step*T1                       T1 = n(n-1)/2
+        sum(i*i) = n*start*start + 2*start*step*T1 + step*step*T2
+                                                           T2 = (n-1)n(2n-1)/6"""
+    t1 = BinOpNode("//", BinOpNode("*", n, BinOpNode("-", n, NumNode(1))), NumNode(2))
+    t2 = BinOpNode("//", BinOpNode("*", BinOpNode("*", n, BinOpNode("-", n, NumNode(1))),
+                                   BinOpNode("-", BinOpNode("*", NumNode(2), n), NumNode(1))),
+                   NumNode(6))
+    return [
+        n,
+        _add(_mul(n, start), _mul(step, t1)),
+        _add(_add(_mul(_mul(n, start), start), _mul(_mul(_mul(NumNode(2), start), step), t1)),
+             _mul(_mul(step, step), t2)),
+    ]
+
+
+class LoopIdioms:
+    def __init__(self, kinds, returns, shadowed, numpy=False):
+        self.kinds = kinds
+        self.returns = returns
+        self.shadowed = shadowed     # names that no longer refer to builtins
+        self.numpy = numpy and not {"np", "int"} & shadowed
+        self.imports = set()         # (module, alias)
+        # fresh variables for the number of terms of closed forms, and the
+        # index array of NumPy reductions
+        self.count = fresh("_n", shadowed)
+        self.index = fresh("_i", shadowed)
+
+    def kind(self, node):
+        return kind_of(node, self.kinds, self.returns)
+
+    def stmt(self, node):
+        if isinstance(node, BlockNode):
+            return BlockNode([self.stmt(s) for s in node.statements])
+        elif isinstance(node, IfNode):
+            return IfNode(node.cond, self.stmt(node.then), self.stmt(node.else_))
+        elif isinstance(node, WhileNode):
+            return WhileNode(node.cond, self.stmt(node.body))
+        elif isinstance(node, ForNode):
+            node = ForNode(node.init, node.cond, node.incr, self.stmt(node.body))
+            return self.reduce(node) or node
+        return node
+
+    def reduce(self, node):
+        """Statements equivalent to the for loop node, or None."""
+        bounds = range_bounds(node)
+        body = node.body
+        if isinstance(body, BlockNode) and len(body.statements) == 1:
+            body = body.statements[0]
+        if bounds is None or "range" in self.shadowed:
+            return None
+        var, start, stop, step = bounds
+        if (var in uses(start) or var in uses(stop)
+                or not self.kind(start) == self.kind(stop) == "int"):
+            return None
+
+        cond = None
+        if isinstance(body, IfNode) and body.else_ is None:
+            cond, body = body.cond, body.then
+            if isinstance(body, BlockNode) and len(body.statements) == 1:
+                body = body.statements[0]
+            best = self.extremum(var, bounds, cond, body)
+            if best is not None:
+                return best
+
+        if not isinstance(body, AssignNode):
+            return None
+        acc = body.name
+        if acc == var or self.kind(VarNode(acc)) != "int":
+            return None
+        if cond is not None and acc in uses(cond):
+            return None
+        iterable = CallNode("range", [start, stop, step])
+
+        # ----------- acc = acc * E -----------
+        value = body.value
+        if isinstance(value, BinOpNode) and value.op == "*":
+            if isinstance(value.left, VarNode) and value.left.name == acc:
+                factor = value.right
+            elif isinstance(value.right, VarNode) and value.right.name == acc:
+                factor = value.left
+            else:
+                return None
+            if acc in uses(factor) or self.kind(factor) != "int":
+                return None
+            if cond is None and var not in uses(factor) and is_pure(factor):
+                n = CallNode("len", [iterable])
+                if isinstance(factor, NumNode) and factor.value < 0:
+                    # -2 ** n is -(2 ** n) in Python; write (-2) ** n
+                    factor = UnaryOpNode("-", NumNode(-factor.value))
+                return AssignNode(acc, BinOpNode("*", VarNode(acc), BinOpNode("**", factor, n)))
+            vector = self.vectorize("prod", bounds, cond, factor, 1, acc)
+            if vector:
+                return vector
+            if "math" in self.shadowed:
+                return None
+            self.imports.add(("math", None))
+            return AssignNode(acc, BinOpNode("*", VarNode(acc), CallNode(
+                "math.prod", [GeneratorNode(factor, var, iterable, cond)])))
+
+        # ----------- acc = acc + E1 - E2 ... -----------
+        parts = terms(value)
+        mine = [(sign, t) for sign, t in parts if isinstance(t, VarNode) and t.name == acc]
+        others = [(sign, t) for sign, t in parts if not (isinstance(t, VarNode) and t.name == acc)]
+        if len(mine) != 1 or mine[0][0] != 1 or not others:
+            return None
+        if any(acc in uses(t) or self.kind(t) != "int" for _, t in others):
+            return None
+        sign, first = others[0]
+        addend = first if sign > 0 else UnaryOpNode("-", first)
+        for sign, t in others[1:]:
+            addend = BinOpNode("+" if sign > 0 else "-", addend, t)
+
+        # The closed form evaluates start several times.
+        closed = (cond is None and "len" not in self.shadowed
+                  and is_pure(addend) and is_pure(start))
+        coefficients = polynomial(addend, var) if closed else None
+        if coefficients is not None:
+            total = NumNode(0)
+            for c, s in zip(coefficients, power_sums(VarNode(self.count), start, step)):
+                total = _add(total, _mul(c, s))
+            return BlockNode([AssignNode(self.count, CallNode("len", [iterable])),
+                              AssignNode(acc, BinOpNode("+", VarNode(acc), total))])
+        vector = self.vectorize("sum", bounds, cond, addend, 0, acc)
+        if vector:
+            return vector
+        if "sum" in self.shadowed:
+            return None
+        return AssignNode(acc, BinOpNode("+", VarNode(acc), CallNode(
+            "sum", [GeneratorNode(addend, var, iterable, cond)])))
+
+    def extremum(self, var, bounds, cond, body):
+        """`if (E > m) m = E;` and friends, as max()/min(), or None."""
+        if not (isinstance(body, AssignNode) and isinstance(cond, BinOpNode)
+                and cond.op in ("<", "<=", ">", ">=")):
+            return None
+        m = body.name
+        value = body.value
+        if isinstance(cond.right, VarNode) and cond.right.name == m and same(cond.left, value):
+            func = "max" if cond.op in (">", ">=") else "min"
+        elif isinstance(cond.left, VarNode) and cond.left.name == m and same(cond.right, value):
+            func = "max" if cond.op in ("<", "<=") else "min"
+        else:
+            return None
+        if (m == var or func in self.shadowed or m in uses(value) or not is_pure(value)
+                or self.kind(VarNode(m)) != "int" or self.kind(value) != "int"):
+            return None
+        vector = self.vectorize(func, bounds, None, value, None, m)
+        if vector:
+            return vector
+        _, start, stop, step = bounds
+        best = CallNode(func, [GeneratorNode(value, var, CallNode("range", [start, stop, step])),
+                               KeywordNode("default", VarNode(m))])
+        return AssignNode(m, CallNode(func, [VarNode(m), best]))
+
+    # ----------- NumPy -----------
+    def vectorize(self, func, bounds, cond, value, neutral, acc):
+        """`acc = acc + int(np.sum(value))` (or with np.prod and *) over
+        the range of bounds, and `acc = int(np.max(value, initial=acc))`
+        for max and min (neutral None); None if value and cond are not
+        element-wise.  neutral is what an element failing cond counts as."""
+        if not self.numpy:
+            return None
+        var, start, stop, step = bounds
+        index = VarNode(self.index)
+        value = self.elementwise(value, var, index)
+        if value is None or value[1] != "int":
+            return None
+        value = value[0]
+        if cond is not None:
+            where = self.elementwise(cond, var, index)
+            if where is None or where[1] != "bool":
+                return None
+            value = CallNode("np.where", [where[0], value, NumNode(neutral)])
+        if self.index not in uses(value):
+            return None
+
+        self.imports.add(("numpy", "np"))
+        index_array = AssignNode(self.index, CallNode("np.arange", [
+            start, stop, step, KeywordNode("dtype", VarNode("np.int64"))]))
+        if neutral is None:
+            total = CallNode("int", [CallNode(f"np.{func}", [value, KeywordNode("initial", VarNode(acc))])])
+        else:
+            op = "+" if func == "sum" else "*"
+            total = BinOpNode(op, VarNode(acc), CallNode("int", [CallNode(f"np.{func}", [value])]))
+        return BlockNode([index_array, AssignNode(acc, total)])
+
+    def elementwise(self, node, var, index):
+        """(node, kind) with var replaced by the index array, if node
+        computes the same thing element by element in int64, kind being
+        "int" or "bool"; else None."""
+        if isinstance(node, VarNode):
+            if node.name == var:
+                return index, "int"
+            return (node, "int") if self.kind(node) == "int" else None
+        if isinstance(node, NumNode):
+            return (node, "int") if is_int(node) and -2 ** 31 <= node.value < 2 ** 31 else None
+        if isinstance(node, UnaryOpNode) and node.op in ("-", "!"):
+            operand = self.elementwise(node.expr, var, index)
+            if operand is None or operand[1] != ("int" if node.op == "-" else "bool"):
+                return None
+            # `not` of an array is an error, ~ of a Python bool is -1 or -2
+            op = "~" if node.op == "!" and self.index in uses(operand[0]) else node.op
+            return UnaryOpNode(op, operand[0]), operand[1]
+        if isinstance(node, BinOpNode):
+            left = self.elementwise(node.left, var, index)
+            right = self.elementwise(node.right, var, index)
+            if left is None or right is None:
+                return None
+            if node.op in ("+", "-", "*") and left[1] == right[1] == "int":
+                return BinOpNode(node.op, left[0], right[0]), "int"
+            # np.remainder rounds like Python's %, but gives 0 for % 0
+            if node.op == "%" and left[1] == "int" and is_int(node.right) and node.right.value:
+                return BinOpNode("%", left[0], right[0]), "int"
+            if node.op in COMPARISONS and left[1] == right[1] == "int":
+                return BinOpNode(node.op, left[0], right[0]), "bool"
+            if node.op in ("&&", "||") and left[1] == right[1] == "bool":
+                return BinOpNode("&" if node.op == "&&" else "|", left[0], right[0]), "bool"
+        return None
+
+
+# ------------------------------
+# Tail calls
+# ------------------------------
+# A function returning a call to itself runs in a loop instead, with the
+# call's arguments assigned to the parameters:
+#
+#     def f(n, acc):                      def f(n, acc):
+#         if (n == 0):                        while True:
+#             return acc          ->              if (n == 0):
+#         return f(n - 1, acc * n)                    return acc
+#                                                 _acc = (acc * n)
+#                                                 n = (n - 1)
+#                                                 acc = _acc
+#
+# so deep recursion neither hits Python's recursion limit nor pays for a
+# call per step.  Calls inside while/for loops are left alone, as a
+# `continue` there would continue the inner loop.
+def tail_calls(program):
+    """Turn self tail calls into loops."""
+    return ProgramNode([
+        TailCalls(d).function() if isinstance(d, FunctionNode) else d
+        for d in program.declarations
+    ])
+
+
+class TailCalls:
+    def __init__(self, function):
+        self.f = function
+        self.params = [p.name for p in function.params]
+        self.taken = set(self.params) | {
+            n.name for n in walk(function.body)
+            if isinstance(n, (DeclarationNode, AssignNode, VarNode))}
+        self.found = False
+
+    def function(self):
+        f = self.f
+        body = self.stmt(f.body)
+        if not self.found:
+            return f
+        body = body.statements if isinstance(body, BlockNode) else [body]
+        if terminates(BlockNode(body)):
+            body = drop_last_continue(BlockNode(body)).statements
+        else:
+            body = body + [ReturnNode(None)]
+        loop = WhileNode(BoolNode(True), BlockNode(body))
+        return FunctionNode(f.ret_type, f.name, f.params, BlockNode([loop]))
+
+    def stmt(self, node):
+        if isinstance(node, BlockNode):
+            return BlockNode([self.stmt(s) for s in node.statements])
+        elif isinstance(node, IfNode):
+            return IfNode(node.cond, self.stmt(node.then), self.stmt(node.else_))
+        elif (isinstance(node, ReturnNode) and isinstance(node.expr, CallNode)
+                and node.expr.name == self.f.name and len(node.expr.args) == len(self.params)):
+            self.found = True
+            return BlockNode(self.rebind(node.expr.args) + [ContinueNode()])
+        return node
+
+    def rebind(self, args):
+        """Assignments giving every parameter its argument at once."""
+        changes = [(p, a) for p, a in zip(self.params, args)
+                   if not (isinstance(a, VarNode) and a.name == p)]
+        # One after the other is fine if no argument reads a parameter
+        # assigned before it.
+        if all(p not in uses(a) for i, (p, _) in enumerate(changes) for _, a in changes[i + 1:]):
+            return [AssignNode(p, a) for p, a in changes]
+        # Otherwise the arguments that do go through temporaries.
+        later = set()
+        for i, (p, _) in enumerate(changes):
+            later |= {j for j in range(i + 1, len(changes)) if p in uses(changes[j][1])}
+        temps = {}
+        for j in sorted(later):
+            temps[j] = fresh("_" + changes[j][0], self.taken)
+            self.taken.add(temps[j])
+        return ([AssignNode(temps[j], changes[j][1]) for j in sorted(later)]
+                + [AssignNode(p, VarNode(temps[j]) if j in temps else a)
+                   for j, (p, a) in enumerate(changes)])
+
+def drop_last_continue(node):
+    """node without the `continue`s that end the loop body anyway."""
+    if isinstance(node, ContinueNode):
+        return BlockNode([])
+    if isinstance(node, BlockNode) and node.statements:
+        return BlockNode(node.statements[:-1] + [drop_last_continue(node.statements[-1])])
+    if isinstance(node, IfNode):
+        return IfNode(node.cond, drop_last_continue(node.then), drop_last_continue(node.else_))
+    return node
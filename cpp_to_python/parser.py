@@ -1,5 +1,7 @@
+from functools import partial
 import ply.yacc as yacc
-from lexer import tokens
+import lexer as _lexer
+from lexer import tokens, OPTIMIZE
 from ast_nodes import *
 
 # Precedence rules
@@ -15,6 +17,10 @@ precedence = (
 )
 
 # Program structure
+#
+# List rules are left-recursive and append to the list built so far, so a
+# block, argument list or << chain of n items is built in O(n) rather than
+# copying the list on every reduction.
 def p_program(p):
     '''program : external_list'''
     p[0] = ProgramNode(p[1])
@@ -25,7 +31,8 @@ def p_external_list(p):
     if len(p) == 2:
         p[0] = [p[1]]
     else:
-        p[0] = p[1] + [p[2]]
+        p[1].append(p[2])
+        p[0] = p[1]
 
 def p_external(p):
     '''external : includes
@@ -61,7 +68,11 @@ def p_param_list(p):
 def p_params(p):
     '''params : param
               | params COMMA param'''
-    p[0] = [p[1]] if len(p) == 2 else p[1] + [p[3]]
+    if len(p) == 2:
+        p[0] = [p[1]]
+    else:
+        p[1].append(p[3])
+        p[0] = p[1]
 
 def p_param(p):
     '''param : type ID'''
@@ -86,7 +97,11 @@ def p_block(p):
 def p_statement_list(p):
     '''statement_list : empty
                       | statement_list statement'''
-    p[0] = [] if p[1] is None else p[1] + [p[2]]
+    if len(p) == 2:
+        p[0] = []
+    else:
+        p[1].append(p[2])
+        p[0] = p[1]
 
 def p_statement(p):
     '''statement : declaration SEMICOLON
@@ -144,7 +159,8 @@ def p_print_tail_single(p):
 
 def p_print_tail_chain(p):
     'print_tail : print_tail SHL expression'
-    p[0] = p[1] + [p[3]]
+    p[1].append(p[3])
+    p[0] = p[1]
 
 # cin >> input
 def p_input_stmt(p):
@@ -157,7 +173,8 @@ def p_input_tail_single(p):
 
 def p_input_tail_chain(p):
     'input_tail : input_tail SHR ID'
-    p[0] = p[1] + [p[3]]
+    p[1].append(p[3])
+    p[0] = p[1]
 
 # if / while / for
 def p_if_stmt(p):
@@ -241,7 +258,8 @@ def p_arg_list_single(p):
 
 def p_arg_list_multi(p):
     'arg_list : arg_list COMMA expression'
-    p[0] = p[1] + [p[3]]
+    p[1].append(p[3])
+    p[0] = p[1]
 
 def p_expression_paren(p):
     'expression : LPAREN expression RPAREN'
@@ -253,10 +271,49 @@ def p_empty(p):
     pass
 
 # Error
+# Messages from the most recent parse; callers clear it before parsing.
+syntax_errors = []
+
 def p_error(p):
     if p:
-        print(f"Syntax error at '{p.value}' (line {p.lineno})")
+        msg = f"Syntax error at '{p.value}' (line {p.lineno})"
     else:
-        print("Syntax error at EOF")
+        msg = "Syntax error at EOF"
+    syntax_errors.append(msg)
+    print(msg)
+
+if OPTIMIZE:
+    # Use the prebuilt parsetab.py (still checked against the grammar
+    # signature); never write parser.out or new tables.
+    parser = yacc.yacc(debug=False, write_tables=False)
+else:
+    parser = yacc.yacc()
+
+
+# Lexer backends
+LEXERS = ("ply", "fast")
+
+def new_lexer(backend="ply"):
+    """Return a fresh lexer for parser.parse(data, lexer=...).
+
+    "ply" is the reflective PLY lexer from lexer.py; "fast" is the
+    single-regex tokenizer in fastlexer.py, which yields the same tokens.
+    """
+    if backend == "fast":
+        from fastlexer import FastLexer
+        return FastLexer()
+    if backend != "ply":
+        raise ValueError(f"unknown lexer backend {backend!r}")
+    return _lexer.lexer.clone()
+
+
+class TokenListLexer:
+    """Feeds already-scanned tokens to the parser, so lexing and parsing
+    can be timed or cached separately: parser.parse(lexer=TokenListLexer(toks))."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.lineno = 1
 
-parser = yacc.yacc()
+    def input(self, data):
+        self.token = partial(next, iter(self.tokens), None)
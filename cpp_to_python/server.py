@@ -0,0 +1,144 @@
+"""Translation server that keeps the parser warm between requests.
+
+Requests and replies are JSON objects, one per line:
+
+    -> {"id": 1, "source": "int main() { cout << 1 << endl; }"}
+    <- {"id": 1, "ok": true, "python": "...", "diagnostics": [], "elapsed_ms": 0.31}
+
+    -> {"id": 2, "op": "stats"}
+    <- {"id": 2, "ok": true, "requests": 1, "mean_ms": 0.31, "p50_ms": 0.31, ...}
+
+Diagnostics are the lexer/parser messages that would otherwise be printed.
+Add "optimize": true to a request to run the optimizer passes (main.py -O),
+"numpy": true to let them use NumPy, and any of codegen.OPTIONS
+(e.g. "fast_input": true) to turn those on.
+Serve on stdin/stdout (the default) or on a Unix socket, where any number
+of clients may connect at once:
+
+    python server.py
+    python server.py --socket /tmp/cpp2py.sock
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from main import translate, TranslationError
+from parser import new_lexer, LEXERS
+from codegen import OPTIONS as CODEGEN_OPTIONS
+
+# Large enough for any single translation unit on one line.
+LINE_LIMIT = 1 << 28
+
+
+class TranslationServer:
+    def __init__(self, lexer_backend="fast"):
+        self.lexer = new_lexer(lexer_backend)
+        self.count = 0
+        self.total_ms = 0.0
+        self.recent_ms = deque(maxlen=10000)   # for percentiles
+
+    def handle(self, line):
+        """Answer one request line with one reply line (both bytes)."""
+        start = time.perf_counter()
+        reply = {"id": None}
+        try:
+            request = json.loads(line)
+            reply["id"] = request.get("id")
+            if request.get("op") == "stats":
+                reply["ok"] = True
+                reply.update(self.stats())
+            else:
+                self.translate(request["source"], reply, bool(request.get("optimize")),
+                               {name: bool(request.get(name))
+                                for name in ("numpy",) + CODEGEN_OPTIONS})
+        except (ValueError, KeyError, AttributeError) as e:
+            reply["ok"] = False
+            reply["error"] = f"bad request: {e!r}"
+
+        elapsed = (time.perf_counter() - start) * 1000
+        reply["elapsed_ms"] = round(elapsed, 3)
+        self.count += 1
+        self.total_ms += elapsed
+        self.recent_ms.append(elapsed)
+        return json.dumps(reply).encode("utf-8") + b"\n"
+
+    def translate(self, source, reply, optimize=False, options=None):
+        captured = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(captured):
+                reply["python"] = translate(source, self.lexer, optimize, **(options or {}))
+            reply["ok"] = True
+        except TranslationError:
+            reply["ok"] = False
+        except Exception as e:
+            reply["ok"] = False
+            reply["error"] = f"{type(e).__name__}: {e}"
+        reply["diagnostics"] = captured.getvalue().splitlines()
+
+    def stats(self):
+        recent = sorted(self.recent_ms)
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 3) if recent else 0.0
+        return {
+            "requests": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "max_ms": round(recent[-1], 3) if recent else 0.0,
+        }
+
+
+def serve_stdio(server):
+    # One client, answered in order, so a plain blocking loop is enough
+    # (and works whether stdin is a pipe, a file or a terminal).
+    out = sys.stdout.buffer
+    for line in sys.stdin.buffer:
+        if line.strip():
+            out.write(server.handle(line))
+            out.flush()
+
+
+async def serve_socket(server, path):
+    async def client(reader, writer):
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    writer.write(server.handle(line))
+                    await writer.drain()
+        finally:
+            writer.close()
+
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    srv = await asyncio.start_unix_server(client, path, limit=LINE_LIMIT)
+    print(f"listening on {path}", file=sys.stderr)
+    async with srv:
+        await srv.serve_forever()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve C++ -> Python translations.")
+    ap.add_argument("--socket", help="listen on this Unix socket instead of stdin")
+    ap.add_argument("--lexer", choices=LEXERS, default="fast")
+    args = ap.parse_args(argv)
+
+    server = TranslationServer(args.lexer)
+    try:
+        if args.socket:
+            asyncio.run(serve_socket(server, args.socket))
+        else:
+            serve_stdio(server)
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The translator's modules live in the folder above, and import each
+# other by their bare names.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: takes a minute or more (deselect with -m 'not slow')")
@@ -0,0 +1,392 @@
+"""C++ programs for the tests and benchmark.py, and ways to run what they
+translate to."""
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import ast_nodes
+from lexer import lexer
+from parser import parser
+
+
+# ------------------------------
+# Synthetic programs
+# ------------------------------
+def statements_program(n):
+    """main() with n simple statements."""
+    lines = ["int main() {", "    int x = 0;"]
+    for i in range(n - 1):
+        if i % 2:
+            lines.append(f"    x = x + {i};")
+        else:
+            lines.append(f"    cout << x << \" \" << {i} << endl;")
+    lines.append("}")
+    return "\n".join(lines)
+
+def chain_program(n):
+    """A single cout statement with n << operands."""
+    return "int main() {\n    cout" + " << 1" * n + ";\n}"
+
+def args_program(n):
+    """A single call with n arguments."""
+    return "int main() {\n    int x = f(" + ", ".join(["1"] * n) + ");\n}"
+
+def nested_program(depth):
+    """Loops and ifs nested depth levels deep."""
+    lines = ["int main() {", "    int x = 0;", "    int n = 3;"]
+    for level in range(depth):
+        pad = "    " * (level + 1)
+        if level % 3 == 0:
+            lines.append(f"{pad}for (int i{level} = 0; i{level} < n; i{level}++) {{")
+        elif level % 3 == 1:
+            lines.append(f"{pad}if (x % {level + 2} == 0) {{")
+        else:
+            lines.append(f"{pad}while (x < {level * 10}) {{")
+        lines.append(f"{pad}    x = x + {level + 1};")
+    for level in reversed(range(depth)):
+        lines.append("    " * (level + 1) + "}")
+    lines.append("    cout << x << endl;")
+    lines.append("}")
+    return "\n".join(lines)
+
+def functions_program(n):
+    """n small numeric functions in the style of tests/test10.cpp, all
+    called from main()."""
+    shapes = [
+        "int f{i}(int n) {{\n    int s = 0;\n    for (int i = 1; i < n + 1; i++) {{\n"
+        "        s = s + (i * i);\n    }}\n    return s;\n}}\n",
+        "int f{i}(int n) {{\n    int a = 0;\n    int b = 1;\n    int t = 0;\n"
+        "    for (int i = 1; i < n + 1; i++) {{\n        t = a + b;\n        a = b;\n"
+        "        b = t;\n    }}\n    return a;\n}}\n",
+        "int f{i}(int x, int y) {{\n    if (x > y) {{\n        return x - y;\n    }}\n"
+        "    else {{\n        return y - x;\n    }}\n}}\n",
+    ]
+    parts = []
+    calls = []
+    for i in range(n):
+        shape = i % len(shapes)
+        parts.append(shapes[shape].format(i=i))
+        calls.append(f"f{i}(5, {i})" if shape == 2 else f"f{i}({i % 20})")
+    body = "".join(f"    total = total + {c};\n" for c in calls)
+    parts.append("int main() {\n    int total = 0;\n" + body + "    cout << total << endl;\n}\n")
+    return "\n".join(parts)
+
+def expression_program(n):
+    """One assignment whose right-hand side has n operands, built as a
+    balanced tree so that nesting stays logarithmic."""
+    ops = ["+", "-", "*", "+"]
+    def build(lo, hi):
+        if hi - lo == 1:
+            return f"v{lo % 8}" if lo % 3 else str(lo)
+        mid = (lo + hi) // 2
+        return f"({build(lo, mid)} {ops[(lo + hi) % 4]} {build(mid, hi)})"
+    decls = "".join(f"    int v{i} = {i + 1};\n" for i in range(8))
+    return f"int main() {{\n{decls}    int r = {build(0, n)};\n    cout << r << endl;\n}}"
+
+def hot_loop_program(n):
+    """A loop run n times, full of constant subexpressions, identities and
+    dead stores."""
+    return f"""int main() {{
+    int n = {n};
+    int s = 0;
+    int i = 0;
+    int unused = 0;
+    double d = 0.5;
+    while (i < n + 1) {{
+        unused = i * i + s;
+        s = s + i * 1 + 0 - (2 * 3 - 6);
+        if (!(s < 1000 * 1000 * 10)) {{
+            s = s - 1000 * 1000 * 10;
+        }}
+        d = d * 1 + 60 * 60 * 0.001 - 0;
+        i = i + 1 + 0;
+    }}
+    cout << s << " " << d << endl;
+}}"""
+
+def random_expression(rng, depth):
+    """A random expression over the variables declared by fuzz_program()."""
+    if depth == 0 or rng.random() < 0.2:
+        return rng.choice(["a", "b", "c", "x", "t", "0", "1", "2", "7", "0.5", "true", "false"])
+    if rng.random() < 0.15:
+        return rng.choice(["-", "!"]) + "(" + random_expression(rng, depth - 1) + ")"
+    op = rng.choice(["+", "-", "*", "/", "%", "<", ">", "<=", ">=", "==", "!=",
+                     "&&", "||", "+ 1", "- 1"])
+    if op in ("+ 1", "- 1"):
+        return f"({random_expression(rng, depth - 1)} {op})"
+    return f"({random_expression(rng, depth - 1)} {op} {random_expression(rng, depth - 1)})"
+
+def random_statements(rng, depth, pad="    "):
+    """Random statements over the variables declared by fuzz_program()."""
+    lines = []
+    for _ in range(rng.randint(1, 4)):
+        r = rng.random()
+        if depth > 0 and r < 0.15:
+            lines.append(f"{pad}if ({random_expression(rng, 2)}) {{")
+            lines += random_statements(rng, depth - 1, pad + "    ")
+            lines.append(f"{pad}}} else {{")
+            lines += random_statements(rng, depth - 1, pad + "    ")
+            lines.append(f"{pad}}}")
+        elif depth > 0 and r < 0.3:
+            k = f"k{depth}"
+            lines.append(f"{pad}{random_loop(rng, k)} {{")
+            if rng.random() < 0.5:
+                lines.append(pad + "    " + random_accumulation(rng, k))
+            else:
+                lines += random_statements(rng, depth - 1, pad + "    ")
+            lines.append(f"{pad}}}")
+        elif r < 0.4:
+            lines.append(f"{pad}cout << {rng.choice('abc')} << \" \";")
+        elif r < 0.45:
+            lines.append(f"{pad}return {random_expression(rng, 1)};")
+        else:
+            lines.append(f"{pad}{rng.choice('abc')} = {random_expression(rng, 2)};")
+    return lines
+
+def random_loop(rng, k):
+    """A counted for loop header with loop variable k."""
+    bound = rng.choice(["0", "3", "7", "a", "b", "c + 2", "-2"])
+    if rng.random() < 0.7:
+        op, step = rng.choice(["<", "<="]), rng.choice([f"{k}++", f"{k} += 2", f"{k} = {k} + 3"])
+        start = rng.choice(["0", "1", "-3", "b"])
+    else:
+        op, step = rng.choice([">", ">="]), rng.choice([f"{k}--", f"{k} -= 2"])
+        start = rng.choice(["5", "9", "a"])
+    return f"for (int {k} = {start}; {k} {op} {bound}; {step})"
+
+def random_accumulation(rng, k):
+    """A loop body in one of the shapes optimizer.LoopIdioms looks for."""
+    acc = rng.choice("abc")
+    term = rng.choice([k, f"{k} * {k}", f"2 * {k} - 1", f"({k} + b) * ({k} - 1)",
+                       "b", f"{k} * {k} * {k}", random_expression(rng, 2)])
+    return rng.choice([
+        f"{acc} = {acc} + {term};",
+        f"{acc} = {term} + {acc} - 1;",
+        f"{acc} = {acc} - {term};",
+        f"{acc} = {acc} * {term};",
+        f"if ({k} % 3 == 1) {acc} = {acc} + {term};",
+        f"if ({term} > {acc}) {acc} = {term};",
+        f"if ({acc} >= {term}) {{ {acc} = {term}; }}",
+    ])
+
+def reduction_program(n):
+    """Accumulation loops of n iterations in the style of tests/test10.cpp."""
+    return f"""int main() {{
+    int n = {n};
+    int s = 0;
+    for (int i = 1; i < n + 1; i++) {{
+        s = s + (i * i);
+    }}
+    int t = 0;
+    for (int i = 0; i < n; i++) {{
+        t = t + i;
+    }}
+    int c = 0;
+    for (int i = 0; i < n; i++) {{
+        if (i % 3 == 0) {{
+            c = c + 1;
+        }}
+    }}
+    int m = 0;
+    for (int i = 0; i < n; i++) {{
+        if (i * (n - i) > m) {{
+            m = i * (n - i);
+        }}
+    }}
+    cout << s << " " << t << " " << c << " " << m << endl;
+}}"""
+
+def tail_call_program(n, depth=500):
+    """Tail-recursive functions called n // depth times, recursing depth
+    calls deep each time."""
+    return f"""int sumTo(int n, int acc) {{
+    if (n == 0) {{
+        return acc;
+    }}
+    return sumTo(n - 1, acc + n);
+}}
+int gcd(int a, int b) {{
+    if (b == 0) {{
+        return a;
+    }}
+    return gcd(b, a % b);
+}}
+int main() {{
+    int s = 0;
+    for (int i = 0; i < {n // depth}; i++) {{
+        s = s + sumTo({depth}, i) % 1000 + gcd(i * 7919, 104729);
+    }}
+    cout << s << endl;
+}}"""
+
+def reader_program():
+    """Reads a count and that many ints, and prints their sum."""
+    return """int main() {
+    int n = 0;
+    cin >> n;
+    int s = 0;
+    for (int i = 0; i < n; i++) {
+        int x = 0;
+        cin >> x;
+        s = s + x;
+    }
+    cout << s << endl;
+}"""
+
+def writer_program(n):
+    """Prints n lines, with a prompt and a read in the middle."""
+    return f"""int main() {{
+    for (int i = 0; i < {n}; i++) {{
+        cout << i << " squared is " << i * i << endl;
+        if (i == {n // 2}) {{
+            int x = 0;
+            cout << "Number: ";
+            cin >> x;
+            cout << "got " << x << endl;
+        }}
+    }}
+    cout << "done";
+}}"""
+
+def recursive_program(n):
+    """Naively recursive functions in the style of tests/test10.cpp, one
+    of them printing (and so not memoizable)."""
+    return f"""int fibonacci(int n) {{
+    if (n < 2) {{
+        return n;
+    }}
+    return fibonacci(n - 1) + fibonacci(n - 2);
+}}
+int paths(int r, int c) {{
+    if (r == 0 || c == 0) {{
+        return 1;
+    }}
+    return paths(r - 1, c) + paths(r, c - 1);
+}}
+int isEven(int n) {{
+    if (n == 0) {{
+        return 1;
+    }}
+    return isOdd(n - 1);
+}}
+int isOdd(int n) {{
+    if (n == 0) {{
+        return 0;
+    }}
+    return isEven(n - 1);
+}}
+int countdown(int n) {{
+    if (n == 0) {{
+        return 0;
+    }}
+    cout << n << " ";
+    return countdown(n - 1) + 1;
+}}
+int main() {{
+    cout << fibonacci({n}) << " " << paths({n // 2}, {n // 2}) << endl;
+    int s = 0;
+    for (int i = 0; i < {n * 20}; i++) {{
+        s = s + isEven(i % 200);
+    }}
+    cout << s << " " << countdown(5) << endl;
+}}"""
+
+def fuzz_program(rng):
+    """main() printing one random expression, or a function made of random
+    statements."""
+    values = {"a": rng.randint(-5, 5), "b": rng.randint(-5, 5), "c": rng.randint(0, 3)}
+    decls = "".join(f"    int {k} = {v};\n" for k, v in values.items())
+    decls += "    double x = 1.5;\n    bool t = true;\n"
+    if rng.random() < 0.5:
+        return f"int main() {{\n{decls}    cout << {random_expression(rng, 4)} << endl;\n}}"
+    body = "\n".join(random_statements(rng, 3))
+    return (f"int f() {{\n{decls}{body}\n    return a;\n}}\n"
+            f"int main() {{\n    cout << f() << endl;\n}}")
+
+# name -> (generator, default size)
+WORKLOADS = {
+    "statements": (statements_program, 20000),
+    "cout_chain": (chain_program, 20000),
+    "nesting": (nested_program, 60),
+    "functions": (functions_program, 1000),
+    "expression": (expression_program, 20000),
+}
+
+def parse(src):
+    lexer.lineno = 1
+    return parser.parse(src, lexer=lexer)
+
+def corpus():
+    """The sources in tests/."""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    return [open(os.path.join(folder, name), encoding="utf-8").read()
+            for name in sorted(os.listdir(folder)) if name.endswith(".cpp")]
+
+
+# ------------------------------
+# Running programs
+# ------------------------------
+def run_program(code):
+    """Run generated Python and return what it prints (or the exception
+    it raised)."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            exec(compile(code, "<generated>", "exec"), {"__name__": "__main__"})
+        except Exception as e:
+            print(type(e).__name__)
+    return out.getvalue()
+
+def run_script(code, stdin, check=True):
+    """(stdout, seconds) of running generated code as a script."""
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(code)
+    try:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, f.name], input=stdin,
+                                capture_output=True, check=check)
+        return result.stdout, time.perf_counter() - start
+    finally:
+        os.unlink(f.name)
+
+
+# ------------------------------
+# Node dispatch
+# ------------------------------
+# The order CodeGenerator tested node classes in, in its if/elif chains
+# for statements and expressions, before it used dispatch tables.
+STATEMENT_CHAIN = ["ProgramNode", "FunctionNode", "BlockNode", "DeclarationNode", "AssignNode",
+                   "PrintNode", "InputNode", "IfNode", "WhileNode", "ForNode", "ReturnNode",
+                   "ContinueNode"]
+EXPRESSION_CHAIN = ["CallNode", "GeneratorNode", "KeywordNode", "BinOpNode", "UnaryOpNode",
+                    "NumNode", "BoolNode", "VarNode", "StringNode"]
+
+def isinstance_chain(names):
+    """A function returning the index of a node's class in names, found
+    by an if/elif chain of isinstance() tests."""
+    lines = ["def chain(node):"]
+    for i, name in enumerate(names):
+        lines.append(f"    {'elif' if i else 'if'} isinstance(node, {name}): return {i}")
+    lines.append("    return -1")
+    namespace = dict(vars(ast_nodes))
+    exec("\n".join(lines), namespace)
+    return namespace["chain"]
+
+class Kinds(ast_nodes.NodeVisitor):
+    """Dispatches like CodeGenerator.expr()."""
+    DISPATCH = {"kind": "kind_unknown"}
+
+    def kind(self, node):
+        return self._kind_methods[type(node)](self, node)
+
+    def kind_unknown(self, node):
+        return -1
+
+def dispatch_visitor(names):
+    """A Kinds visitor returning the index of a node's class in names."""
+    methods = {f"kind_{name}": (lambda self, node, i=i: i) for i, name in enumerate(names)}
+    return type("NamedKinds", (Kinds,), methods)()
@@ -0,0 +1,41 @@
+"""NodeVisitor dispatch and NodeTransformer."""
+import pytest
+
+import ast_nodes
+from codegen import CodeGenerator
+from tests.programs import (EXPRESSION_CHAIN, STATEMENT_CHAIN, WORKLOADS, dispatch_visitor,
+                            isinstance_chain, parse)
+
+
+class Renamer(ast_nodes.NodeTransformer):
+    def visit_VarNode(self, node):
+        return ast_nodes.VarNode(node.name.upper()) if node.name.islower() else node
+
+
+@pytest.fixture(scope="module", params=list(WORKLOADS))
+def tree(request):
+    make, size = WORKLOADS[request.param]
+    return parse(make(max(1, size // 100)))
+
+
+@pytest.mark.parametrize("names", [STATEMENT_CHAIN, EXPRESSION_CHAIN])
+def test_dispatch_agrees_with_isinstance(tree, names):
+    chain, visit = isinstance_chain(names), dispatch_visitor(names).kind
+    nodes = list(ast_nodes.walk(tree))
+    assert [chain(n) for n in nodes] == [visit(n) for n in nodes]
+
+
+def test_transformer_shares_unchanged_tree(tree):
+    assert ast_nodes.NodeTransformer().visit(tree) is tree
+
+
+def test_transformer_leaves_original(tree):
+    before = CodeGenerator().generate(tree)
+    renamed = Renamer().visit(tree)
+    assert CodeGenerator().generate(tree) == before
+    if renamed is not tree:
+        assert CodeGenerator().generate(renamed) != before
+
+
+def test_base_visitor_walks_tree(tree):
+    assert ast_nodes.NodeVisitor().visit(tree) is None
@@ -0,0 +1,16 @@
+"""Serialized ASTs load as the trees that were saved."""
+import pytest
+
+import astcache
+from tests.programs import corpus, parse, statements_program
+
+
+@pytest.mark.parametrize("src", corpus() + [statements_program(1000)])
+def test_round_trip(src):
+    tree = parse(src)
+    assert repr(astcache.loads(astcache.dumps(tree))) == repr(tree)
+
+
+def test_version_covers_both_lexers():
+    # Either lexer backend may have built a cached tree (--lexer).
+    assert {"lexer.py", "fastlexer.py"} <= set(astcache.PARSER_MODULES)
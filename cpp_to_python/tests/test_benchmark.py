@@ -0,0 +1,11 @@
+"""Helpers of benchmark.py."""
+from benchmark import same_tokens
+
+
+def test_same_tokens():
+    assert same_tokens("1.0  2500000.0\n3.14159265\n", "1 2.5e+06 3.14159\n")
+    assert same_tokens("a b", "a\nb")
+    assert not same_tokens("sum= 12", "sum=12")
+    assert not same_tokens("True", "1")
+    assert not same_tokens("1 2", "1 2 3")
+    assert not same_tokens("3.2", "3.1")
@@ -0,0 +1,62 @@
+"""Code generation options change how programs run, not what they print."""
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import codegen
+from codegen import CodeGenerator
+from tests.programs import (functions_program, parse, reader_program, recursive_program,
+                            run_program, run_script, writer_program)
+
+
+def test_memoize_same_output():
+    tree = parse(recursive_program(16))
+    assert codegen.memoizable(tree) == {"fibonacci", "paths", "isEven", "isOdd"}
+    plain = run_program(CodeGenerator().generate(tree))
+    assert run_program(CodeGenerator(memoize=True).generate(tree)) == plain
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_same_code(workers):
+    tree = parse(functions_program(200))
+    options = {"memoize": True, "buffered_output": True}
+    serial = CodeGenerator(**options).generate(tree)
+    assert codegen.generate_parallel(tree, workers, **options) == serial
+
+
+def test_one_worker_does_not_import_multiprocessing():
+    # --metrics would charge the import to the first file's codegen stage
+    script = ("import sys, codegen; from main import parse_source; "
+              "codegen.generate_parallel(parse_source('int main() {\\n}\\n'), 1); "
+              "print('multiprocessing' in sys.modules)")
+    folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=folder,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split()[-1] == "False"
+
+
+def test_fast_input_reads_tokens():
+    rng = random.Random(0)
+    numbers = [rng.randint(-10 ** 9, 10 ** 9) for _ in range(100)]
+    one_per_line = f"{len(numbers)}\n".encode() + b"\n".join(str(x).encode() for x in numbers) + b"\n"
+    # cin reads tokens, wherever the line breaks are
+    packed = f"{len(numbers)} ".encode() + b" ".join(str(x).encode() for x in numbers[:10]) + \
+             b"\n" + b"\n".join(b" ".join(str(x).encode() for x in numbers[i:i + 7])
+                                for i in range(10, len(numbers), 7))
+    tree = parse(reader_program())
+    fast = CodeGenerator(fast_input=True).generate(tree)
+    expected = f"{sum(numbers)}\n".encode()
+    assert run_script(CodeGenerator().generate(tree), one_per_line)[0] == expected
+    assert run_script(fast, one_per_line)[0] == expected
+    assert run_script(fast, packed)[0] == expected
+
+
+@pytest.mark.parametrize("options", [{"buffered_output": True},
+                                     {"buffered_output": True, "fast_input": True}])
+def test_buffered_output_same_lines(options):
+    tree = parse(writer_program(1000))
+    plain = run_script(CodeGenerator().generate(tree), b"42\n")[0]
+    assert run_script(CodeGenerator(**options).generate(tree), b"42\n")[0] == plain
@@ -0,0 +1,83 @@
+"""Re-translating after an edit gives what translating from scratch does."""
+import contextlib
+import io
+import random
+import re
+
+import pytest
+
+from fastlexer import FastLexer
+from incremental import IncrementalTranslator
+from main import translate, TranslationError
+from tests.programs import functions_program, recursive_program
+
+
+EDIT_SNIPPETS = ["{", "}", ";", "/*", "*/", "//", '"', "\n", " ", "x", "1",
+                 "int g(int a) { return a; }\n", "#include <vector>\n"]
+
+def random_edit(rng, src):
+    """src with one random edit: a digit changed, a function copied or
+    removed, or a few characters inserted or deleted anywhere."""
+    kind = rng.randrange(4)
+    if kind == 0:
+        digits = [i for i, ch in enumerate(src) if ch.isdigit()]
+        if digits:
+            i = rng.choice(digits)
+            return src[:i] + str(rng.randrange(10)) + src[i + 1:]
+    if kind == 1:
+        starts = [m.start() for m in re.finditer(r"^int ", src, re.M)]
+        if len(starts) > 1:
+            k = rng.randrange(len(starts) - 1)
+            function = src[starts[k]:starts[k + 1]]
+            if rng.random() < 0.5:
+                return src[:starts[k]] + src[starts[k + 1]:]
+            return src[:starts[k]] + function.replace(" f", " h", 1) + src[starts[k]:]
+    i = rng.randrange(len(src) + 1)
+    if kind == 2:
+        return src[:i] + rng.choice(EDIT_SNIPPETS) + src[i:]
+    return src[:i] + src[i + rng.randrange(1, 20):]
+
+def translated(translate, src):
+    """(translate(src), None), or (None, the message) for a syntax error."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            return translate(src), None
+        except TranslationError as e:
+            return None, str(e)
+
+
+@pytest.mark.parametrize("options", [{}, {"memoize": True, "buffered_output": True,
+                                          "fast_input": True},
+                                     {"optimize": True}])
+def test_random_edits(options):
+    rng = random.Random(0)
+    translator = IncrementalTranslator(**options)
+    full = lambda src: translate(src, FastLexer(), **options)
+    base = functions_program(30) + recursive_program(3)
+    for step in range(150):
+        src = random_edit(rng, base)
+        expected = translated(full, src)
+        assert translated(translator.translate, src) == expected, f"edit {step}"
+        if expected[1] is None:
+            base = src
+
+
+def test_one_function_edited():
+    src = functions_program(50)
+    edited = src.replace("s = s + (i * i)", "s = s + (i * i * i)", 1)
+    translator = IncrementalTranslator()
+    translator.translate(src)
+    assert translator.translate(edited) == translate(edited, FastLexer())
+    assert translator.parsed == 1
+
+
+def test_error_line_after_block_comment():
+    # The lexer does not count the newlines inside /* */, so neither may
+    # the chunks it reuses.
+    src = "/* one\n two\n */\nint f() {\n    return 1;\n}\nint main() {\n    int x = 1;\n}\n"
+    broken = src.replace("int x = 1;", "int x = ;")
+    translator = IncrementalTranslator()
+    translator.translate(src)
+    expected = translated(lambda s: translate(s, FastLexer()), broken)
+    assert expected[1] is not None
+    assert translated(translator.translate, broken) == expected
@@ -0,0 +1,33 @@
+"""The fast lexer gives the tokens the PLY lexer does."""
+import pytest
+
+from parser import new_lexer
+from tests.programs import corpus
+
+
+# Inputs that exercise the lexer's corner cases: escapes, comments spanning
+# lines, illegal characters, numbers followed by dots, trailing whitespace
+# with no final newline.
+LEXER_EDGE_CASES = [
+    'cout << "tab\\there" << "quote\\"d" << "bad \\q escape";',
+    '/* one\n two */ x = 1; // trailing\ny = 2.5 + 3. - .5;',
+    'a & b | c @ $ `x` a&&b||!c',
+    'x+=1;y-=2;z++;w--;a<<b>>c<=d>=e==f!=g<h>i=j',
+    '#include <iostream>\n#include<vector>',
+    '\r\n\t \n\n\n',
+    'int main() {\n    x = 1;\n} \t',
+]
+
+
+def token_stream(lex, data):
+    lex.lineno = 1
+    lex.input(data)
+    return [(t.type, t.value, t.lineno, t.lexpos) for t in iter(lex.token, None)]
+
+
+@pytest.mark.parametrize("data", corpus() + LEXER_EDGE_CASES)
+def test_same_tokens_as_ply(data, capsys):
+    expected = token_stream(new_lexer("ply"), data)
+    ply_messages = capsys.readouterr().out
+    assert token_stream(new_lexer("fast"), data) == expected
+    assert capsys.readouterr().out == ply_messages
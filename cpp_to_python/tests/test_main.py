@@ -0,0 +1,71 @@
+"""main.py: --run and builds."""
+import os
+import sys
+
+import pytest
+
+from main import build, run_programs, translate
+from tests.programs import recursive_program, run_script
+
+
+@pytest.mark.parametrize("options", [{}, {"buffered_output": True, "memoize": True},
+                                     {"optimize": True}])
+def test_run_prints_program_output(tmp_path, capsys, options):
+    first, second = tmp_path / "a.cpp", tmp_path / "b.cpp"
+    first.write_text(recursive_program(10))
+    second.write_text('int main() {\n    cout << "second" << endl;\n}\n')
+    # What each program prints run as a script, in order
+    expected = b"".join(run_script(translate(path.read_text(), **options), b"")[0]
+                        for path in (first, second))
+    assert run_programs([str(first), str(second)], str(tmp_path), **options) == 0
+    assert capsys.readouterr().out.encode() == expected
+
+
+def test_run_reports_failures(tmp_path, capsys):
+    path = tmp_path / "a.cpp"
+    path.write_text("int main() {\n    int x = 0;\n    cout << 5 / x << endl;\n}\n")
+    assert run_programs([str(path)], str(tmp_path)) == 1
+    assert 'a.py", line' in capsys.readouterr().err
+
+
+def test_run_keeps_recursion_limit(tmp_path, capsys):
+    path = tmp_path / "a.cpp"
+    path.write_text(recursive_program(10))
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(1000)     # below what --memoize asks for
+    try:
+        assert run_programs([str(path)], str(tmp_path), memoize=True) == 0
+        assert sys.getrecursionlimit() == 1000
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+@pytest.mark.parametrize("rebuild", [{"force": True}, {"settings": {"optimize": True}}])
+def test_build_removes_outputs_of_deleted_sources(tmp_path, rebuild):
+    src_dir, out_dir = tmp_path / "src", tmp_path / "out"
+    src_dir.mkdir()
+    for name in ("a.cpp", "b.cpp"):
+        (src_dir / name).write_text("int main() {\n}\n")
+    build(str(src_dir), str(out_dir))
+    os.remove(src_dir / "a.cpp")
+    # A forced build, or one by a different translator version, does not
+    # use the manifest to skip files, but still cleans up after it.
+    build(str(src_dir), str(out_dir), **rebuild)
+    assert not (out_dir / "a.py").exists()
+    assert (out_dir / "b.py").exists()
+
+
+def test_build_survives_unreadable_sources(tmp_path, capsys):
+    src_dir, out_dir = tmp_path / "src", tmp_path / "out"
+    src_dir.mkdir()
+    (src_dir / "a.cpp").write_text("int main() {\n}\n")
+    (src_dir / "b.cpp").write_bytes(b"int main() {\n    // caf\xe9\n}\n")     # Latin-1
+    (src_dir / "c.cpp").mkdir()
+    (src_dir / "d.cpp").write_text("int main() {\n}\n")
+    entries, converted, skipped, failed, records = build(str(src_dir), str(out_dir))
+    assert (converted, failed) == (2, ["b.cpp", "c.cpp"])
+    out = capsys.readouterr().out
+    assert "[FAIL]" in out and "b.cpp" in out and "c.cpp" in out
+    assert (out_dir / "a.py").exists() and (out_dir / "d.py").exists()
+    # The manifest was saved, so only the failed files are tried again
+    assert build(str(src_dir), str(out_dir))[1:4] == (0, 2, ["b.cpp", "c.cpp"])
@@ -0,0 +1,82 @@
+"""-O (and -O --numpy) leaves what programs print unchanged."""
+import random
+
+import pytest
+
+import optimizer
+from codegen import CodeGenerator
+from tests.programs import (corpus, fuzz_program, hot_loop_program, parse, reduction_program,
+                            run_program, run_script, tail_call_program)
+
+
+def overflows(output):
+    """True if output shows a number a C++ int cannot hold, i.e. the
+    program overflowed and C++ gives it no defined output."""
+    return any(abs(int(word)) >= 2 ** 31 for word in output.split()
+               if word.lstrip("-").isdigit())
+
+
+def outputs(src, numpy=False):
+    """What the plain and the optimized translations of src print."""
+    tree = parse(src)
+    plain = CodeGenerator().generate(tree)
+    folded = CodeGenerator().generate(optimizer.optimize(tree, numpy))
+    return run_program(plain), run_program(folded)
+
+
+@pytest.mark.parametrize("numpy", [False, True])
+def test_random_programs(numpy):
+    rng = random.Random(0)
+    for _ in range(300):
+        src = fuzz_program(rng)
+        expected, got = outputs(src, numpy)
+        # NumPy's fixed-width ints wrap where Python's do not; C++ gives
+        # such programs no defined output anyway.
+        if numpy and overflows(expected):
+            continue
+        assert got == expected, src
+
+
+@pytest.mark.parametrize("make", [hot_loop_program, reduction_program, tail_call_program])
+@pytest.mark.parametrize("numpy", [False, True])
+def test_workloads(make, numpy):
+    expected, got = outputs(make(2000), numpy)
+    assert got == expected
+
+
+@pytest.mark.parametrize("src", corpus())
+def test_corpus_compiles(src):
+    compile(CodeGenerator().generate(optimizer.optimize(parse(src), True)), "<generated>", "exec")
+
+
+def test_deep_tail_recursion():
+    # Too deep for the plain translation, which stops with RecursionError
+    deep = CodeGenerator().generate(optimizer.optimize(parse(tail_call_program(10 ** 6, 10 ** 6))))
+    assert run_program(deep)[0].isdigit()
+
+
+@pytest.mark.parametrize("factor", ["-2", "(0 - 3)", "-1"])
+@pytest.mark.parametrize("trips", [4, 5])
+def test_product_of_negative_factor(factor, trips):
+    src = f"""int main() {{
+    int p = 1;
+    for (int i = 0; i < {trips}; i++) {{
+        p = p * {factor};
+    }}
+    cout << p << endl;
+}}"""
+    expected, got = outputs(src)
+    assert got == expected
+    assert "**" in CodeGenerator().generate(optimizer.optimize(parse(src)))
+
+
+def test_cin_into_bool_reads_a_string():
+    src = """int main() {
+    bool b = false;
+    cin >> b;
+    cout << !!b << " " << (b == true) << endl;
+}"""
+    tree = parse(src)
+    plain = CodeGenerator().generate(tree)
+    folded = CodeGenerator().generate(optimizer.optimize(tree))
+    assert run_script(folded, b"1\n")[0] == run_script(plain, b"1\n")[0]
@@ -0,0 +1,31 @@
+"""Parse time grows linearly with the number of statements, << operands
+and call arguments."""
+import gc
+import time
+
+import pytest
+
+from tests.programs import args_program, chain_program, parse, statements_program
+
+
+def parse_seconds(src):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        parse(src)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("make", [statements_program, chain_program, args_program])
+def test_parse_time_scales_linearly(make):
+    # A quadratic rule costs 1000x more per item at 1M than at 1k; allow
+    # 3x for noise against the cheapest size so far.
+    best = None
+    for n in (1000, 10000, 100000, 1000000):
+        per_item = parse_seconds(make(n)) / n
+        best = min(best or per_item, per_item)
+        assert per_item < 3 * best, f"{n} items: {per_item * 1e6:.1f} us each"
@@ -0,0 +1,27 @@
+"""Importing the parser in optimized mode reads and writes no table files."""
+import hashlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def snapshot(folder):
+    """Name -> (mtime, content hash) of the files in folder."""
+    files = {}
+    for e in os.scandir(folder):
+        if e.is_file():
+            with open(e.path, "rb") as f:
+                files[e.name] = (e.stat().st_mtime_ns, hashlib.sha256(f.read()).hexdigest())
+    return files
+
+
+@pytest.mark.parametrize("module", ["lexer", "parser"])
+def test_import_writes_nothing(module):
+    env = dict(os.environ, CPP2PY_OPTIMIZE="1", PYTHONDONTWRITEBYTECODE="1")
+    before = snapshot(FOLDER)
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=FOLDER, env=env, check=True)
+    assert snapshot(FOLDER) == before
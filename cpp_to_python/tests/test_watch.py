@@ -0,0 +1,101 @@
+"""--watch keeps outputs up to date as sources change."""
+import os
+
+from fastlexer import FastLexer
+from main import build, translate, DEFAULT_SETTINGS
+import watch
+from watch import WatchedFolder
+from tests.programs import functions_program
+
+
+def test_update(tmp_path):
+    src_dir, out_dir = tmp_path / "src", tmp_path / "out"
+    src_dir.mkdir()
+    src = functions_program(20)
+    (src_dir / "big.cpp").write_text(src)
+    build(str(src_dir), str(out_dir))
+    state = WatchedFolder(str(src_dir), str(out_dir), DEFAULT_SETTINGS)
+    state.warm_up()
+
+    edited = src.replace("return s;", "return s + 1;", 1)
+    (src_dir / "big.cpp").write_text(edited)
+    state.update({"big.cpp"})
+    assert (out_dir / "big.py").read_text() == translate(edited, FastLexer())
+
+    os.remove(src_dir / "big.cpp")
+    state.update({"big.cpp"})
+    assert not (out_dir / "big.py").exists()
+
+
+def test_update_reports_unreadable_sources(tmp_path, capsys):
+    src_dir, out_dir = tmp_path / "src", tmp_path / "out"
+    src_dir.mkdir()
+    out_dir.mkdir()
+    (src_dir / "bad.cpp").mkdir()
+    (src_dir / "good.cpp").write_text("int main() {\n    cout << 1 << endl;\n}\n")
+    state = WatchedFolder(str(src_dir), str(out_dir), DEFAULT_SETTINGS)
+    state.update({"bad.cpp", "good.cpp"})
+    assert "[FAIL]" in capsys.readouterr().out
+    assert (out_dir / "good.py").exists()
+    assert set(state.files) == {"good.cpp"}
+
+
+def test_update_survives_translator_errors(tmp_path, capsys):
+    src_dir, out_dir = tmp_path / "src", tmp_path / "out"
+    src_dir.mkdir()
+    out_dir.mkdir()
+    for name in ("bad.cpp", "good.cpp"):
+        (src_dir / name).write_text("int main() {\n    cout << 1 << endl;\n}\n")
+    state = WatchedFolder(str(src_dir), str(out_dir), DEFAULT_SETTINGS)
+    broken = state.new_translator()
+    def translate(source):
+        raise RecursionError("maximum recursion depth exceeded")
+    broken.translate = translate
+    state.translators["bad.cpp"] = broken
+    state.update({"bad.cpp", "good.cpp"})
+    assert "[FAIL]" in capsys.readouterr().out
+    assert (out_dir / "good.py").exists()
+    assert set(state.files) == {"good.cpp"}
+    # The next save gets a new translator
+    state.update({"bad.cpp"})
+    assert (out_dir / "bad.py").exists()
+
+
+def test_overflow_asks_for_rescan(tmp_path):
+    watcher = watch.InotifyWatcher(str(tmp_path))
+    os.close(watcher.fd)
+    watcher.fd, w = os.pipe()
+    os.write(w, watch._EVENT.pack(-1, watch.IN_Q_OVERFLOW, 0, 0))
+    os.close(w)
+    try:
+        assert watch.RESCAN in watcher.wait(0)
+    finally:
+        watcher.close()
+
+
+def test_rescan_names_include_deleted(tmp_path):
+    src_dir, out_dir = tmp_path / "src", tmp_path / "out"
+    src_dir.mkdir()
+    for name in ("a.cpp", "b.cpp"):
+        (src_dir / name).write_text("int main() {\n}\n")
+    build(str(src_dir), str(out_dir))
+    state = WatchedFolder(str(src_dir), str(out_dir), DEFAULT_SETTINGS)
+    os.remove(src_dir / "a.cpp")
+    (src_dir / "c.cpp").write_text("int main() {\n}\n")
+    assert state.names() == {"a.cpp", "b.cpp", "c.cpp"}
+
+
+def test_watch_builds_with_options(tmp_path, monkeypatch):
+    calls = []
+    class Stop:
+        def wait(self, timeout=None):
+            raise KeyboardInterrupt
+        def close(self):
+            pass
+    monkeypatch.setattr(watch, "new_watcher", lambda folder, poll: Stop())
+    monkeypatch.setattr(watch, "build", lambda *args: calls.append(args) or ([], 0, 0, [], []))
+    reports = []
+    assert watch.watch(str(tmp_path), str(tmp_path / "out"), force=True, workers=3,
+                       report=lambda *result: reports.append(result)) == 0
+    assert calls[0][2:4] == (True, 3)
+    assert reports == [([], 0, 0, [], [])]
@@ -0,0 +1,266 @@
+"""Watch mode (main.py --watch): translate sources again as they are saved.
+
+After an ordinary build, the source folder is watched with inotify where
+the C library has it, and by polling file sizes and mtimes otherwise.  A
+burst of saves (an editor writing a temporary file and renaming it, or a
+checkout touching many files) is collected until the folder has been
+quiet for the debounce interval, and then only the files that changed are
+translated again, each by its own IncrementalTranslator, so an edit to one
+function costs about as much as translating that function.  Every output
+is reported with the time from the save (the source's mtime) to the
+output being written, and the build manifest is kept up to date.
+"""
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import time
+import tracemalloc
+
+from incremental import IncrementalTranslator
+from main import (TranslationError, translator_version, output_name, load_manifest,
+                  save_manifest, build, DEFAULT_SETTINGS, CODEGEN_OPTIONS)
+
+
+# ------------------------------
+# Watchers
+# ------------------------------
+# wait(timeout) returns the names of the files in the folder that changed,
+# were added or removed since the last call, waiting up to timeout seconds
+# (forever if None) for the first one; an empty set if there was none.
+# The set holds RESCAN if changes were lost, and every file must be checked.
+RESCAN = None
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_CLOEXEC = 0o2000000
+WATCH_EVENTS = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct("iIII")     # wd, mask, cookie, len; then the name
+
+
+class InotifyWatcher:
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_EVENTS) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"cannot watch {folder}")
+
+    def wait(self, timeout=None):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 1 << 16)
+        names = set()
+        pos = 0
+        while pos < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                # The kernel's event queue was full and dropped events.
+                names.add(RESCAN)
+            names.add(os.fsdecode(data[pos:pos + length].rstrip(b"\0")))
+            pos += length
+        names.discard("")
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Compares the size and mtime of every file every `interval` seconds."""
+
+    def __init__(self, folder, interval=0.1):
+        self.folder = folder
+        self.interval = interval
+        self.seen = self.scan()
+
+    def scan(self):
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            return {}
+        stats = {}
+        for e in entries:
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            stats[e.name] = (st.st_size, st.st_mtime_ns)
+        return stats
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None else min(self.interval, deadline - now))
+            current = self.scan()
+            names = {name for name in current.keys() | self.seen.keys()
+                     if current.get(name) != self.seen.get(name)}
+            self.seen = current
+            if names:
+                return names
+
+    def close(self):
+        pass
+
+
+def new_watcher(folder, poll=False):
+    """An inotify watcher for folder, or a polling one if inotify is not
+    available (or poll is set)."""
+    if not poll:
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError, TypeError):
+            # No inotify in this C library (AttributeError), or no C
+            # library found at all (TypeError from CDLL(None) on Windows).
+            pass
+    return PollingWatcher(folder)
+
+
+# ------------------------------
+# Watch loop
+# ------------------------------
+class WatchedFolder:
+    """Keeps the outputs of one source folder up to date."""
+
+    def __init__(self, test_folder, output_folder, settings):
+        self.test_folder = test_folder
+        self.output_folder = output_folder
+        self.version = translator_version(settings)
+        options = {name: settings[name] for name in CODEGEN_OPTIONS}
+        self.new_translator = lambda: IncrementalTranslator(
+            settings["optimize"], settings["numpy"], **options)
+        self.translators = {}
+        self.files = load_manifest(output_folder, self.version)
+
+    def warm_up(self):
+        """Translate every source once, in memory, so that the first save
+        of each is already incremental."""
+        for name in self.files:
+            try:
+                with open(os.path.join(self.test_folder, name), "r", encoding="utf-8") as f:
+                    cpp_code = f.read()
+                translator = self.new_translator()
+                translator.translate(cpp_code)
+            except (OSError, UnicodeDecodeError, TranslationError):
+                continue
+            self.translators[name] = translator
+
+    def names(self):
+        """Every source in the folder, and every one that was."""
+        try:
+            present = {e.name for e in os.scandir(self.test_folder)}
+        except OSError:
+            present = set()
+        return present | self.files.keys()
+
+    def update(self, names):
+        """Translate the named sources again, or remove the outputs of
+        the ones that are gone."""
+        for name in sorted(names):
+            path = os.path.join(self.test_folder, name)
+            output_path = os.path.join(self.output_folder, output_name(name))
+            try:
+                st = os.stat(path)
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self.translators.pop(name, None)
+                if self.files.pop(name, None) is not None:
+                    try:
+                        os.remove(output_path)
+                    except OSError:
+                        pass
+                    print(f"[DEL] {path}")
+                continue
+            except OSError as e:
+                self.files.pop(name, None)
+                print(f"[FAIL] {path}: {e}")
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            prev = self.files.get(name)
+            if prev is not None and prev["hash"] == digest:
+                continue
+
+            translator = self.translators.setdefault(name, self.new_translator())
+            start = time.perf_counter()
+            try:
+                py_code = translator.translate(data.decode("utf-8"))
+            except Exception as e:
+                # As in build(), any error fails this file only.  After an
+                # unexpected one the translator starts afresh next time.
+                if not isinstance(e, TranslationError):
+                    self.translators.pop(name, None)
+                self.files.pop(name, None)
+                print(f"[FAIL] {path}: {type(e).__name__}: {e}")
+                continue
+            try:
+                with open(output_path, "w", encoding="utf-8") as f:
+                    f.write(py_code)
+            except OSError as e:
+                self.files.pop(name, None)
+                print(f"[FAIL] {path}: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            latency = (time.time_ns() - st.st_mtime_ns) / 1e6
+            self.files[name] = {"hash": digest, "size": st.st_size,
+                                "mtime": st.st_mtime_ns, "output": output_name(name)}
+            print(f"[OK] Converted: {path} -> {output_path}  ({elapsed * 1000:.1f} ms, "
+                  f"{latency:.1f} ms after save; {translator.reused} chunks reused, "
+                  f"{translator.parsed} parsed)")
+        save_manifest(self.output_folder, self.version, self.files)
+
+
+def watch(test_folder, output_folder, settings=None, debounce=0.05, poll=False,
+          force=False, workers=1, report=None):
+    """Build, then translate sources again as they change, until
+    interrupted.  force and workers are passed to build(), and its result
+    to report() if given."""
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    watcher = new_watcher(test_folder, poll)
+    try:
+        result = build(test_folder, output_folder, force, workers, settings)
+        if report is not None:
+            report(*result)
+        else:
+            _, converted, skipped, failed, _ = result
+            print(f"\n{converted} converted, {skipped} up to date, {len(failed)} failed.")
+        if settings["metrics"]:
+            # Metrics are for the build; tracing would slow every update.
+            tracemalloc.stop()
+        state = WatchedFolder(test_folder, output_folder, settings)
+        state.warm_up()
+        kind = "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+        print(f"Watching '{test_folder}/' ({kind}); press Ctrl-C to stop.", flush=True)
+
+        while True:
+            names = watcher.wait()
+            # Wait for the burst of saves to end.
+            while more := watcher.wait(debounce):
+                names |= more
+            if RESCAN in names:
+                names = state.names()
+            names = {n for n in names if n.endswith(".cpp")}
+            if names:
+                state.update(names)
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()